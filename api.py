@@ -0,0 +1,250 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, request, url_for
+from werkzeug.http import is_resource_modified
+
+from models import db, News, NewsImage, NewsVideo, Comment, Event
+from pagination import KeysetPagination
+from replica import ReadReplica
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# Как часто меняется ETag списка мероприятий без записей в базу, секунд
+EVENTS_ETAG_PERIOD = 15 * 60
+
+# Поля, которые можно запросить через ?fields=, и соответствующие колонки
+NEWS_FIELDS = {
+    'id': News.id,
+    'title': News.title,
+    'content': News.content,
+    'created_at': News.created_at,
+    'comment_count': News.comment_count,
+    'image_count': News.image_count,
+    'video_count': News.video_count,
+    'cover_image': News.cover_image_path,
+}
+NEWS_DEFAULT_FIELDS = ['id', 'title', 'created_at', 'comment_count', 'image_count', 'video_count', 'cover_image']
+# Связанные данные подгружаются отдельным запросом и только для одной новости
+NEWS_DETAIL_FIELDS = {'images', 'videos'}
+
+EVENT_FIELDS = {
+    'id': Event.id,
+    'title': Event.title,
+    'description': Event.description,
+    'event_date': Event.event_date,
+    'location': Event.location,
+    'image': Event.image_path,
+    'created_at': Event.created_at,
+}
+EVENT_DEFAULT_FIELDS = ['id', 'title', 'event_date', 'location', 'image']
+
+COMMENT_FIELDS = {
+    'id': Comment.id,
+    'author': Comment.author,
+    'content': Comment.content,
+    'created_at': Comment.created_at,
+}
+COMMENT_DEFAULT_FIELDS = list(COMMENT_FIELDS)
+
+
+class ApiError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+@api.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify(error=error.message), error.status_code
+
+
+def _requested_fields(available, default, extra=()):
+    raw = request.args.get('fields')
+    if not raw:
+        return list(default)
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available and field not in extra]
+    if unknown:
+        raise ApiError(f"Неизвестные поля: {', '.join(unknown)}")
+    return fields
+
+
+def _limit():
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _upload_url(path):
+    if not path:
+        return None
+    return url_for('uploaded_files', filename=path.split('/')[-1], _external=True)
+
+
+def _serialize(value, field):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if field in ('cover_image', 'image'):
+        return _upload_url(value)
+    return value
+
+
+def _projection(query_columns, fields, key_columns):
+    """Колонки запроса: запрошенные поля плюс ключ пагинации (он нужен для курсора)"""
+    columns = [query_columns[field] for field in fields if field in query_columns]
+    for column in key_columns:
+        if not any(column is existing for existing in columns):
+            columns.append(column)
+    return columns
+
+
+def _rows(rows, fields):
+    return [{field: _serialize(getattr(row, query_key), field) for field, query_key in fields} for row in rows]
+
+
+def _keys(fields, available):
+    # Имя атрибута строки результата совпадает с ключом колонки модели
+    return [(field, available[field].key) for field in fields if field in available]
+
+
+def _page(pagination, fields, available):
+    return jsonify(
+        items=_rows(pagination.items, _keys(fields, available)),
+        next_cursor=pagination.next_cursor,
+        prev_cursor=pagination.prev_cursor,
+    )
+
+
+def conditional(*tags, extra_key=None):
+    """Декоратор: ETag и Last-Modified по версиям тегов кэша страниц.
+
+    Версия тега меняется при каждой записи в соответствующие таблицы, поэтому
+    ответ 304 отдается без запросов к базе. extra_key - функция, добавляющая
+    к ETag то, что меняется без записи (например, наступление мероприятия).
+    С extra_key Last-Modified не отдается: по одной дате изменения клиент,
+    присылающий только If-Modified-Since, не заметил бы такой смены.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = current_app.extensions['page_cache'].tag_versions(*tags)
+            key = f'{request.full_path}|{versions}'
+            if extra_key is not None:
+                key += f'|{extra_key()}'
+            etag = hashlib.sha256(key.encode()).hexdigest()
+            last_modified = None
+            if extra_key is None and max(versions, default=0):
+                last_modified = datetime.fromtimestamp(max(versions) // 10 ** 9, timezone.utc)
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = view(*args, **kwargs)
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Клиент может хранить ответ, но обязан проверять его актуальность
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+@api.route('/news')
+@ReadReplica.reads
+@conditional('news')
+def news_list():
+    fields = _requested_fields(NEWS_FIELDS, NEWS_DEFAULT_FIELDS)
+    key_columns = [News.created_at, News.id]
+    query = db.session.query(*_projection(NEWS_FIELDS, fields, key_columns))
+    pagination = KeysetPagination(query, key_columns, per_page=_limit(), cursor=request.args.get('cursor'))
+    return _page(pagination, fields, NEWS_FIELDS)
+
+
+@api.route('/news/<int:news_id>')
+@ReadReplica.reads
+@conditional('news')
+def news_detail(news_id):
+    fields = _requested_fields(NEWS_FIELDS, NEWS_DEFAULT_FIELDS + ['content'], NEWS_DETAIL_FIELDS)
+    columns = _projection(NEWS_FIELDS, fields, [News.id])
+    row = db.session.query(*columns).filter(News.id == news_id).first()
+    if row is None:
+        raise ApiError("Новость не найдена", 404)
+
+    item = _rows([row], _keys(fields, NEWS_FIELDS))[0]
+    if 'images' in fields:
+        images = db.session.query(NewsImage.image_path).filter_by(news_id=news_id) \
+            .order_by(NewsImage.order, NewsImage.id).all()
+        item['images'] = [_upload_url(image.image_path) for image in images]
+    if 'videos' in fields:
+        videos = db.session.query(NewsVideo.video_type, NewsVideo.title, NewsVideo.embed_url,
+                                  NewsVideo.video_url, NewsVideo.video_path) \
+            .filter_by(news_id=news_id).order_by(NewsVideo.order, NewsVideo.id).all()
+        item['videos'] = [{
+            'type': video.video_type,
+            'title': video.title,
+            'embed_url': video.embed_url,
+            'url': url_for('uploaded_videos', filename=video.video_path.split('/')[-1], _external=True)
+            if video.video_path else video.video_url,
+        } for video in videos]
+    return jsonify(item)
+
+
+@api.route('/news/<int:news_id>/comments')
+@ReadReplica.reads
+@conditional('news')
+def news_comments(news_id):
+    if db.session.query(News.id).filter(News.id == news_id).first() is None:
+        raise ApiError("Новость не найдена", 404)
+    fields = _requested_fields(COMMENT_FIELDS, COMMENT_DEFAULT_FIELDS)
+    key_columns = [Comment.created_at, Comment.id]
+    query = db.session.query(*_projection(COMMENT_FIELDS, fields, key_columns)).filter(Comment.news_id == news_id)
+    pagination = KeysetPagination(query, key_columns, per_page=_limit(), cursor=request.args.get('cursor'))
+    return _page(pagination, fields, COMMENT_FIELDS)
+
+
+def _events_time_bucket():
+    # Мероприятия переходят из предстоящих в прошедшие без записи в базу: ETag меняется
+    # раз в EVENTS_ETAG_PERIOD, поэтому список устаревает не больше чем на этот срок
+    return int(time.time()) // EVENTS_ETAG_PERIOD
+
+
+@api.route('/events')
+@ReadReplica.reads
+@conditional('events', extra_key=_events_time_bucket)
+def events_list():
+    fields = _requested_fields(EVENT_FIELDS, EVENT_DEFAULT_FIELDS)
+    key_columns = [Event.event_date, Event.id]
+    query = db.session.query(*_projection(EVENT_FIELDS, fields, key_columns))
+
+    # upcoming - ближайшие сначала, past - последние прошедшие сначала
+    when = request.args.get('when', 'upcoming')
+    if when == 'upcoming':
+        query = query.filter(Event.event_date >= datetime.now())
+    elif when == 'past':
+        query = query.filter(Event.event_date < datetime.now())
+    elif when != 'all':
+        raise ApiError("Параметр when: upcoming, past или all")
+
+    pagination = KeysetPagination(query, key_columns, per_page=_limit(), cursor=request.args.get('cursor'),
+                                  descending=when == 'past')
+    return _page(pagination, fields, EVENT_FIELDS)
+
+
+@api.route('/events/<int:event_id>')
+@ReadReplica.reads
+@conditional('events')
+def event_detail(event_id):
+    fields = _requested_fields(EVENT_FIELDS, EVENT_DEFAULT_FIELDS + ['description'])
+    row = db.session.query(*_projection(EVENT_FIELDS, fields, [Event.id])).filter(Event.id == event_id).first()
+    if row is None:
+        raise ApiError("Мероприятие не найдено", 404)
+    return jsonify(_rows([row], _keys(fields, EVENT_FIELDS))[0])
@@ -1,11 +1,12 @@
+import hmac
+import io
 import os
-import re
+import zipfile
 from datetime import datetime
 
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, send_file, abort
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_mail import Mail, Message
-from werkzeug.utils import secure_filename
+from flask_mail import Mail
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 from config import Config
@@ -15,10 +16,40 @@ app = Flask(__name__)
 app.config.from_object(Config)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
-from models import db, News, Event, Comment, User, NewsVideo, NewsImage
+from models import db, News, Event, Comment, User, NewsVideo, NewsImage, OutboxMessage
+from search import search as run_search, create_search_index
+from page_cache import PageCache
+from images import responsive_image, schedule_variants
+import chunked_uploads
+import storage
+from media import send_media
+from outbox import Outbox
+from pagination import KeysetPagination
+from metrics import RequestMetrics
+from replica import ReadReplica
+from user_cache import UserCache
+import archive
+from api import api, conditional
+import media_gc
+from event_calendar import EventCalendar, parse_month, shift_month
+from feeds import Feeds, FEED_FORMATS, canonical_url_builder
+from login_throttle import LoginThrottle, LoginThrottled
+from template_cache import TemplateCache
+from assets import Assets
 
 db.init_app(app)
 mail = Mail(app)
+outbox = Outbox(app, mail)
+page_cache = PageCache(app)
+request_metrics = RequestMetrics(app)
+read_replica = ReadReplica(app)
+user_cache = UserCache(app)
+event_calendar = EventCalendar(page_cache, app)
+feeds = Feeds(page_cache, app)
+login_throttle = LoginThrottle(app)
+template_cache = TemplateCache(app)
+assets = Assets(app)
+app.register_blueprint(api)
 
 # Настройка Flask-Login
 login_manager = LoginManager()
@@ -28,7 +59,8 @@ login_manager.login_message = 'Пожалуйста, войдите для до
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Снимок из кэша вместо SELECT на каждый запрос вошедшего пользователя
+    return user_cache.load(int(user_id))
 
 UPLOAD_FOLDER = '/data/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
@@ -46,13 +78,25 @@ def allowed_video_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_VIDEO_EXTENSIONS
 
+# Файлы с именем по хэшу содержимого не меняются, поэтому их можно кэшировать навсегда
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+def send_upload(directory, filename):
+    if not storage.is_content_addressed(filename):
+        return send_media(directory, filename)
+
+    response = send_media(directory, filename, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/data/uploads/<path:filename>')
 def uploaded_files(filename):
-    return send_from_directory('/data/uploads', filename)
+    return send_upload('/data/uploads', filename)
 
 @app.route('/data/uploads/videos/<path:filename>')
 def uploaded_videos(filename):
-    return send_from_directory('/data/uploads/videos', filename)
+    return send_upload('/data/uploads/videos', filename)
 
 @app.context_processor
 def inject_models():
@@ -69,16 +113,21 @@ def inject_models():
 
 # Маршруты
 @app.route('/')
+@read_replica.reads
+@page_cache.cached('news', 'events')
 def index():
     return render_template('index.html')
 
 
 @app.route('/about')
+@page_cache.cached()
 def about():
     return render_template('about.html')
 
 
 @app.route('/news/<int:news_id>', methods=['GET', 'POST'])
+@read_replica.reads
+@page_cache.cached('news')
 def news_detail(news_id):
     news_item = News.query.get_or_404(news_id)
 
@@ -91,17 +140,19 @@ def news_detail(news_id):
         comment = Comment(news_id=news_id, author=author, content=content)
         db.session.add(comment)
         db.session.commit()
+        page_cache.invalidate('news')
 
         # Перенаправляем на ту же страницу чтобы избежать повторной отправки формы
         return redirect(url_for('news_detail', news_id=news_id))
 
     # Если метод GET, отображаем страницу с комментариями
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     comments_per_page = 10
 
-    comments_pagination = Comment.query.filter_by(news_id=news_id) \
-        .order_by(Comment.created_at.desc()) \
-        .paginate(page=page, per_page=comments_per_page, error_out=False)
+    # Общее количество показываем из счетчика новости, поэтому COUNT не нужен
+    comments_pagination = KeysetPagination(Comment.query.filter_by(news_id=news_id),
+                                           [Comment.created_at, Comment.id],
+                                           per_page=comments_per_page, cursor=cursor)
 
     return render_template('news_detail.html',
                            news_item=news_item,
@@ -109,14 +160,48 @@ def news_detail(news_id):
                            comments_pagination=comments_pagination)
 
 
+@app.route('/news/<fmt>.xml')
+@read_replica.reads
+@conditional('news')
+def news_feed(fmt):
+    if fmt not in FEED_FORMATS:
+        abort(404)
+    mimetype = 'application/atom+xml' if fmt == 'atom' else 'application/rss+xml'
+    return send_file(feeds.news_feed_path(fmt), mimetype=mimetype, conditional=False, etag=False, max_age=0)
+
+
+@app.route('/sitemap.xml')
+@read_replica.reads
+@conditional('news', 'events')
+def sitemap():
+    return Response(feeds.sitemap_index(), mimetype='application/xml')
+
+
+@app.route('/sitemap-<kind>-<int:number>.xml')
+@read_replica.reads
+@conditional('news', 'events')
+def sitemap_shard(kind, number):
+    path = feeds.sitemap_shard_path(kind, number)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='application/xml', conditional=False, etag=False, max_age=0)
+
+
+@app.route('/robots.txt')
+def robots_txt():
+    return Response(f"User-agent: *\nDisallow: /admin\nSitemap: {canonical_url_builder()('sitemap')}\n",
+                    mimetype='text/plain')
+
+
 @app.route('/news')
+@read_replica.reads
+@page_cache.cached('news')
 def news():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 6  # Количество новостей на странице
 
-    news_pagination = News.query.order_by(News.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    news_pagination = KeysetPagination(News.list_query(), [News.created_at, News.id],
+                                       per_page=per_page, cursor=cursor)
 
     return render_template('news.html',
                            news_list=news_pagination.items,
@@ -133,17 +218,21 @@ def delete_comment(comment_id):
     news_id = comment.news_id
     db.session.delete(comment)
     db.session.commit()
+    page_cache.invalidate('news')
     return redirect(url_for('news_detail', news_id=news_id))
 
 
 @app.route('/events')
+@read_replica.reads
+@page_cache.cached('events')
 def events():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 6  # Количество мероприятий на странице
 
-    # Предстоящие мероприятия с пагинацией
-    upcoming_events_query = Event.query.filter(Event.event_date >= datetime.now()).order_by(Event.event_date.asc())
-    upcoming_pagination = upcoming_events_query.paginate(page=page, per_page=per_page, error_out=False)
+    # Предстоящие мероприятия с пагинацией по ключу (event_date, id)
+    upcoming_events_query = Event.query.filter(Event.event_date >= datetime.now())
+    upcoming_pagination = KeysetPagination(upcoming_events_query, [Event.event_date, Event.id],
+                                           per_page=per_page, cursor=cursor, descending=False)
 
     # Прошедшие мероприятия (без пагинации или с ограничением)
     past_events = Event.query.filter(Event.event_date < datetime.now()).order_by(Event.event_date.desc()).limit(
@@ -156,11 +245,36 @@ def events():
 
 
 @app.route('/events/<int:event_id>')
+@read_replica.reads
+@page_cache.cached('events')
 def event_detail(event_id):
     event = Event.query.get_or_404(event_id)
     return render_template('event_detail.html', event=event)
 
 
+@app.route('/events/calendar')
+@read_replica.reads
+@page_cache.cached('events')
+def events_calendar():
+    year, month = parse_month(request.args.get('month'))
+    return render_template('events_calendar.html',
+                           year=year,
+                           month=month,
+                           weeks=event_calendar.month_weeks(year, month),
+                           prev_month='%04d-%02d' % shift_month(year, month, -1),
+                           next_month='%04d-%02d' % shift_month(year, month, 1))
+
+
+@app.route('/events.ics')
+@read_replica.reads
+@conditional('events')
+def events_feed():
+    # Файл ленты строится один раз после каждого изменения мероприятий,
+    # повторные запросы календарей получают 304 без обращения к базе
+    return send_file(event_calendar.feed_path(), mimetype='text/calendar', download_name='events.ics',
+                     conditional=False, etag=False, max_age=0)
+
+
 @app.route('/admin/event/delete/<int:event_id>')
 @login_required
 def delete_event(event_id):
@@ -170,6 +284,7 @@ def delete_event(event_id):
     event = Event.query.get_or_404(event_id)
     db.session.delete(event)
     db.session.commit()
+    page_cache.invalidate('events')
     return redirect(url_for('events'))
 
 
@@ -194,11 +309,12 @@ def edit_event(event_id):
         if 'image' in request.files:
             file = request.files['image']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+                filename = storage.save_upload(file, app.config['UPLOAD_FOLDER'])
+                schedule_variants(app.config['UPLOAD_FOLDER'], filename)
                 event.image_path = f'uploads/{filename}'
 
         db.session.commit()
+        page_cache.invalidate('events')
         return redirect(url_for('event_detail', event_id=event.id))
 
     # Преобразуем дату для HTML input[type="datetime-local"]
@@ -215,15 +331,13 @@ def contact():
         message = request.form['message']
 
         try:
-            # Создаем и отправляем email
-            msg = Message(
+            # Ставим письмо в очередь - отправит фоновый отправитель
+            outbox.enqueue(
                 subject=f"Новое сообщение от {name}",
                 sender=app.config['MAIL_DEFAULT_SENDER'],
                 recipients=[app.config['MAIL_USERNAME']],  # Отправляем себе
-                reply_to=email  # Чтобы можно было ответить отправителю
-            )
-
-            msg.body = f"""
+                reply_to=email,  # Чтобы можно было ответить отправителю
+                body=f"""
             Имя: {name}
             Email: {email}
 
@@ -233,17 +347,17 @@ def contact():
             ---
             Это сообщение отправлено через форму обратной связи на сайте.
             """
+            )
 
-            mail.send(msg)
-
-            # Логируем успешную отправку
-            print(f"Email отправлен: от {name} ({email})")
+            # Логируем постановку в очередь
+            print(f"Email поставлен в очередь: от {name} ({email})")
 
             return redirect(url_for('contact_success'))
 
         except Exception as e:
             # В случае ошибки показываем сообщение и логируем
-            print(f"Ошибка отправки email: {str(e)}")
+            db.session.rollback()
+            print(f"Ошибка сохранения email: {str(e)}")
             flash('Произошла ошибка при отправке сообщения. Пожалуйста, попробуйте позже.', 'error')
             return render_template('contact.html')
 
@@ -272,9 +386,9 @@ def add_news():
             images = request.files.getlist('images')
             for i, image in enumerate(images):
                 if image and image.filename and allowed_file(image.filename):
-                    filename = secure_filename(image.filename)
+                    filename = storage.save_upload(image, app.config['UPLOAD_FOLDER'])
                     image_path = f'uploads/{filename}'
-                    image.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+                    schedule_variants(app.config['UPLOAD_FOLDER'], filename)
 
                     news_image = NewsImage(
                         news_id=news.id,
@@ -302,9 +416,8 @@ def add_news():
                 if i < len(video_files) and video_files[i] and video_files[i].filename and allowed_video_file(
                         video_files[i].filename):
                     file = video_files[i]
-                    filename = secure_filename(file.filename)
+                    filename = storage.save_upload(file, video_upload_folder)
                     video_path = f'uploads/videos/{filename}'
-                    file.save(os.path.join(video_upload_folder, filename))
 
                     news_video = NewsVideo(
                         news_id=news.id,
@@ -327,6 +440,7 @@ def add_news():
                     db.session.add(news_video)
 
         db.session.commit()
+        page_cache.invalidate('news')
         return redirect(url_for('news'))
 
     return render_template('add_news.html')
@@ -343,15 +457,20 @@ def delete_news(news_id):
     # Удаляем все комментарии
     Comment.query.filter_by(news_id=news_id).delete()
 
-    # Удаляем все изображения (файлы останутся на сервере - можно добавить их удаление)
+    # Удаляем все изображения (файлы без ссылок удаляет сборщик collect_media.py -
+    # один файл может использоваться несколькими записями)
     NewsImage.query.filter_by(news_id=news_id).delete()
 
     # Удаляем все видео
     NewsVideo.query.filter_by(news_id=news_id).delete()
 
+    # Массовое удаление идет мимо событий ORM, поэтому счетчики обнуляем явно
+    news.comment_count = news.image_count = news.video_count = 0
+
     # Удаляем саму новость
     db.session.delete(news)
     db.session.commit()
+    page_cache.invalidate('news')
 
     return redirect(url_for('news'))
 
@@ -375,9 +494,9 @@ def edit_news(news_id):
             for i, image in enumerate(images):
                 if image and image.filename and allowed_file(
                         image.filename):  # Проверяем, что файл действительно загружен
-                    filename = secure_filename(image.filename)
+                    filename = storage.save_upload(image, app.config['UPLOAD_FOLDER'])
                     image_path = f'uploads/{filename}'
-                    image.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+                    schedule_variants(app.config['UPLOAD_FOLDER'], filename)
 
                     news_image = NewsImage(
                         news_id=news.id,
@@ -402,9 +521,8 @@ def edit_news(news_id):
                 if i < len(video_files) and video_files[i] and video_files[i].filename and allowed_video_file(
                         video_files[i].filename):
                     file = video_files[i]
-                    filename = secure_filename(file.filename)
+                    filename = storage.save_upload(file, video_upload_folder)
                     video_path = f'uploads/videos/{filename}'
-                    file.save(os.path.join(video_upload_folder, filename))
 
                     news_video = NewsVideo(
                         news_id=news.id,
@@ -427,6 +545,7 @@ def edit_news(news_id):
                     db.session.add(news_video)
 
         db.session.commit()
+        page_cache.invalidate('news')
         return redirect(url_for('news_detail', news_id=news.id))
 
     return render_template('edit_news.html', news=news)
@@ -442,6 +561,7 @@ def delete_news_image(image_id):
     news_id = image.news_id
     db.session.delete(image)
     db.session.commit()
+    page_cache.invalidate('news')
 
     return redirect(url_for('edit_news', news_id=news_id))
 
@@ -456,9 +576,84 @@ def delete_news_video(video_id):
     news_id = video.news_id
     db.session.delete(video)
     db.session.commit()
+    page_cache.invalidate('news')
 
     return redirect(url_for('edit_news', news_id=news_id))
 
+
+# Потоковая загрузка видео частями с возможностью продолжения
+@app.route('/admin/news/<int:news_id>/video/upload', methods=['POST'])
+@login_required
+def start_video_upload(news_id):
+    if not current_user.is_admin:
+        return jsonify(error='Доступ запрещен'), 403
+
+    News.query.get_or_404(news_id)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    filename = data.get('filename')
+    if not isinstance(filename, str) or not allowed_video_file(filename):
+        return jsonify(error='Недопустимый формат видео'), 400
+
+    video_upload_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'videos')
+    try:
+        upload = chunked_uploads.start_upload(video_upload_folder, news_id, filename,
+                                              data.get('size'), data.get('title'))
+    except chunked_uploads.UploadError as e:
+        return jsonify(error=e.message), e.status_code
+
+    return jsonify(upload_id=upload['upload_id'], offset=0, size=upload['size']), 201
+
+
+@app.route('/admin/news/video/upload/<upload_id>', methods=['GET', 'PATCH'])
+@login_required
+def video_upload(upload_id):
+    if not current_user.is_admin:
+        return jsonify(error='Доступ запрещен'), 403
+
+    video_upload_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'videos')
+    upload = chunked_uploads.load_upload(video_upload_folder, upload_id)
+    if upload is None:
+        return jsonify(error='Загрузка не найдена'), 404
+
+    if request.method == 'GET':
+        # Клиент узнает, с какого байта продолжать после обрыва соединения
+        return jsonify(upload_id=upload_id, offset=chunked_uploads.upload_offset(video_upload_folder, upload),
+                       size=upload['size'])
+
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return jsonify(error='Не указан заголовок Upload-Offset'), 400
+
+    try:
+        offset = chunked_uploads.write_chunk(video_upload_folder, upload, offset, request.stream)
+    except chunked_uploads.UploadError as e:
+        return jsonify(error=e.message, offset=chunked_uploads.upload_offset(video_upload_folder, upload)), \
+            e.status_code
+
+    if offset < upload['size']:
+        return jsonify(upload_id=upload_id, offset=offset, size=upload['size'])
+
+    # Файл получен полностью - прикрепляем его к новости
+    filename = chunked_uploads.finish_upload(video_upload_folder, upload)
+    if filename is None:
+        # Загрузку уже завершил параллельный запрос, видео к новости он и прикрепил
+        return jsonify(upload_id=upload_id, offset=offset, size=upload['size'])
+    order = NewsVideo.query.filter_by(news_id=upload['news_id']).count()
+    news_video = NewsVideo(
+        news_id=upload['news_id'],
+        video_path=f'uploads/videos/{filename}',
+        video_type='uploaded',
+        title=upload['title'] or f"Видео {order + 1}",
+        order=order
+    )
+    db.session.add(news_video)
+    db.session.commit()
+    page_cache.invalidate('news')
+
+    return jsonify(upload_id=upload_id, offset=offset, size=upload['size'], video_id=news_video.id)
+
 @app.route('/admin/events/add', methods=['GET', 'POST'])
 @login_required
 def add_event():
@@ -477,8 +672,8 @@ def add_event():
         if 'image' in request.files:
             file = request.files['image']
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+                filename = storage.save_upload(file, app.config['UPLOAD_FOLDER'])
+                schedule_variants(app.config['UPLOAD_FOLDER'], filename)
                 image_path = f'uploads/{filename}'
 
         # Создаем мероприятие
@@ -491,6 +686,7 @@ def add_event():
         )
         db.session.add(event)
         db.session.commit()
+        page_cache.invalidate('events')
 
         return redirect(url_for('events'))
 
@@ -499,7 +695,83 @@ def add_event():
 @app.route('/admin')
 @login_required
 def admin_panel():
-    return render_template('admin_panel.html')
+    # Статус доставки писем из формы обратной связи
+    outbox_stats = dict(db.session.query(OutboxMessage.status, db.func.count(OutboxMessage.id))
+                        .group_by(OutboxMessage.status).all())
+    outbox_messages = OutboxMessage.query.order_by(OutboxMessage.created_at.desc()).limit(10).all()
+    return render_template('admin_panel.html', outbox_stats=outbox_stats, outbox_messages=outbox_messages)
+
+@app.route('/admin/export/<kind>.<fmt>')
+@login_required
+def export_data(kind, fmt):
+    if not current_user.is_admin:
+        return "Доступ запрещен", 403
+    if kind not in archive.KINDS or fmt not in archive.FORMATS:
+        return "Неизвестная выгрузка", 404
+
+    # Строки отдаются по мере чтения из базы, выгрузка целиком в памяти не собирается
+    response = Response(stream_with_context(archive.export_lines(kind, fmt)), mimetype=archive.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{fmt}'
+    return response
+
+@app.route('/admin/import', methods=['POST'])
+@login_required
+def import_data():
+    if not current_user.is_admin:
+        return "Доступ запрещен", 403
+
+    kind = request.form.get('kind')
+    file = request.files.get('file')
+    if kind not in archive.KINDS or not file or not file.filename:
+        flash('Выберите тип данных и файл для импорта', 'error')
+        return redirect(url_for('admin_panel'))
+
+    media = None
+    media_file = request.files.get('media')
+    if media_file and media_file.filename:
+        try:
+            media = archive.ZipMedia(media_file.stream)
+        except zipfile.BadZipFile:
+            flash('Медиафайлы должны быть zip-архивом', 'error')
+            return redirect(url_for('admin_panel'))
+
+    fmt = 'csv' if file.filename.lower().endswith('.csv') else 'ndjson'
+    stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+    importer = archive.Importer(app.config['UPLOAD_FOLDER'], media, keep_ids='keep_ids' in request.form)
+    try:
+        count = importer.run(kind, archive.read_records(stream, fmt))
+        flash(f'Импортировано записей: {count}', 'success')
+    except (archive.ArchiveError, UnicodeDecodeError) as e:
+        flash(f'Ошибка импорта: {e}', 'error')
+    finally:
+        page_cache.invalidate('events' if kind == 'events' else 'news')
+
+    return redirect(url_for('admin_panel'))
+
+@app.route('/admin/media', methods=['GET', 'POST'])
+@login_required
+def admin_media():
+    if not current_user.is_admin:
+        return "Доступ запрещен", 403
+
+    # GET только считает (dry-run), POST удаляет файлы без ссылок
+    deleted = request.method == 'POST'
+    report = media_gc.collect(app.config['UPLOAD_FOLDER'], dry_run=not deleted)
+    return render_template('admin_media.html', report=report, deleted=deleted,
+                           grace_hours=media_gc.DEFAULT_GRACE_SECONDS // 3600,
+                           categories=media_gc.CATEGORIES, format_size=media_gc.format_size)
+
+@app.route('/admin/metrics')
+def metrics():
+    # Prometheus не умеет входить на сайт, поэтому кроме администратора пускаем по токену
+    token = app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    # Сравниваем байты: compare_digest для строк с не-ASCII символами бросает TypeError
+    has_token = bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not has_token and not (current_user.is_authenticated and current_user.is_admin):
+        return "Доступ запрещен", 403
+
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -510,9 +782,23 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        user = User.query.filter_by(username=username).first()
-
-        if user and user.check_password(password):
+        try:
+            # Отказ по лимиту попыток - до запроса к базе и вычисления хэша
+            login_throttle.acquire(request.remote_addr, username)
+            user = User.query.filter_by(username=username).first()
+            password_hash = user.password_hash if user else None
+            valid = login_throttle.check_password(password_hash, password) and password_hash is not None
+        except LoginThrottled as e:
+            response = app.make_response((render_template('login.html', error=e.message), e.status_code))
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+
+        if valid:
+            login_throttle.reset(username)
+            if login_throttle.needs_rehash(user.password_hash):
+                # Пароль известен только сейчас - пересчитываем хэш с текущими параметрами
+                user.set_password(password, method=app.config['PASSWORD_HASH_METHOD'])
+                db.session.commit()
             login_user(user)
             return redirect(url_for('admin_panel'))
         else:
@@ -547,7 +833,7 @@ def register():
             return render_template('register.html', error='Пользователь с таким именем уже существует')
 
         user = User(username=username, email=email, is_admin=is_admin)
-        user.set_password(password)
+        user.set_password(password, method=app.config['PASSWORD_HASH_METHOD'])
         db.session.add(user)
         db.session.commit()
 
@@ -557,6 +843,7 @@ def register():
 
 
 @app.route('/search')
+@read_replica.reads
 def search():
     query = request.args.get('q', '').strip()
     page = request.args.get('page', 1, type=int)
@@ -565,96 +852,49 @@ def search():
     if not query:
         return render_template('search.html', query=query)
 
-    # Разбиваем запрос на слова для улучшения поиска
-    search_terms = query.split()
+    # Полнотекстовый поиск: ранжированные результаты и количество за один проход
+    results = run_search(query, page=page, per_page=per_page)
+
+    return render_template('search.html',
+                           query=query,
+                           news_results=results.news_pagination.items,
+                           events_results=results.events,
+                           news_pagination=results.news_pagination,
+                           total_news=results.news_pagination.total,
+                           total_events=results.total_events)
+
 
-    # Поиск по новостям
-    news_filters = []
-    for term in search_terms:
-        news_filters.append(News.title.ilike(f'%{term}%'))
-        news_filters.append(News.content.ilike(f'%{term}%'))
+@app.template_global('responsive_image')
+def responsive_image_global(image_path, **kwargs):
+    return responsive_image(app.config['UPLOAD_FOLDER'], image_path, **kwargs)
 
-    news_results = News.query.filter(db.or_(*news_filters)).order_by(News.created_at.desc())
 
-    # Поиск по мероприятиям
-    event_filters = []
-    for term in search_terms:
-        event_filters.append(Event.title.ilike(f'%{term}%'))
-        event_filters.append(Event.description.ilike(f'%{term}%'))
-        event_filters.append(Event.location.ilike(f'%{term}%'))
+def init_database():
+    """Создает таблицы и поисковый индекс (один раз при запуске, не в каждом воркере)"""
+    with app.app_context():
+        db.create_all()
+        create_search_index()
 
-    events_results = Event.query.filter(db.or_(*event_filters)).order_by(Event.event_date.desc())
 
-    # Пагинация
-    news_pagination = news_results.paginate(page=page, per_page=per_page, error_out=False)
-    events_list = events_results.limit(10).all()
+def precompile_templates():
+    """Компилирует шаблоны до fork, чтобы воркеры не разбирали их на первых запросах"""
+    return template_cache.precompile(app)
 
-    return render_template('search.html',
-                           query=query,
-                           news_results=news_pagination.items,
-                           events_results=events_list,
-                           news_pagination=news_pagination,
-                           total_news=news_results.count(),
-                           total_events=events_results.count())
-
-
-def extract_vk_params(url):
-    """Извлекает параметры oid и id из VK URL для iframe"""
-    # Обрабатываем разные домены VK
-    vk_domains = ['vk.com', 'vkvideo.ru', 'm.vk.com']
-    is_vk_url = any(domain in url for domain in vk_domains)
-
-    if is_vk_url:
-        # Обрабатываем разные форматы VK ссылок
-        patterns = [
-            r'video-?(\d+)_(\d+)',  # video-12345_67890 или video12345_67890
-            r'video/(\d+)_(\d+)',  # video/12345_67890
-            r'video\.php\?.*?oid=([^&]+).*?id=([^&]+)',  # video.php?oid=...&id=...
-            r'video-(\d+)_(\d+)',  # video-12345_67890
-            r'video(\d+)_(\d+)'  # video12345_67890
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                oid, video_id = match.groups()
-                # Если oid отрицательный (для групп), оставляем как есть
-                if oid.startswith('-'):
-                    return f"oid={oid}&id={video_id}"
-                else:
-                    return f"oid=-{oid}&id={video_id}"
-
-    return None
-
-
-def extract_rutube_video_id(url):
-    """Извлекает ID видео из RuTube URL"""
-    if 'rutube.ru' in url:
-        # Ищем video ID в разных форматах URL
-        patterns = [
-            r'video/([a-zA-Z0-9]+)/',  # .../video/abc123/
-            r'play/embed/([a-zA-Z0-9]+)',  # .../play/embed/abc123
-            r'video/([a-zA-Z0-9]+)\??'  # .../video/abc123?
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                return match.group(1)
-    return None
-
-
-# Регистрируем фильтры в Jinja2
-@app.template_filter('extract_vk_params')
-def extract_vk_params_filter(url):
-    return extract_vk_params(url)
-
-@app.template_filter('extract_rutube_video_id')
-def extract_rutube_video_id_filter(url):
-    return extract_rutube_video_id(url)
 
+def build_assets():
+    """Собирает статику с хэшами в именах (пересобираются только измененные файлы)"""
+    return assets.build(app)
+
+@app.route('/healthz')
+def healthz():
+    try:
+        db.session.execute(db.text('SELECT 1'))
+    except Exception as e:
+        app.logger.error("Проверка здоровья: база недоступна: %s", e)
+        return jsonify(status='error'), 503
+    return jsonify(status='ok')
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Сервер разработки; в продакшене: gunicorn --config gunicorn.conf.py app:app
+    init_database()
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000)
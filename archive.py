@@ -0,0 +1,366 @@
+import csv
+import io
+import json
+import os
+import zipfile
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import safe_join
+
+import storage
+from images import schedule_variants
+from models import db, News, NewsImage, NewsVideo, Comment, Event
+from search import invalidate_fallback_index
+from video_embeds import resolve_embed
+
+# Записей в одной транзакции импорта и в одной выборке экспорта
+BATCH_SIZE = 500
+
+KINDS = ('news', 'events', 'comments')
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+FIELDS = {
+    'news': ['id', 'title', 'content', 'created_at', 'images', 'videos'],
+    'events': ['id', 'title', 'description', 'event_date', 'location', 'image_path', 'created_at'],
+    'comments': ['id', 'news_id', 'author', 'content', 'created_at'],
+}
+# Поля-списки, которые в CSV хранятся строкой JSON
+NESTED_FIELDS = {'images', 'videos'}
+
+
+class ArchiveError(Exception):
+    """Ошибка в данных импорта; line - номер строки входного файла"""
+
+    def __init__(self, message, line=None):
+        super().__init__(f"Строка {line}: {message}" if line else message)
+        self.line = line
+
+
+# --- Источники медиафайлов для импорта ---
+
+class DirectoryMedia:
+    """Медиафайлы из папки (имена в данных - пути относительно нее)"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def open(self, name):
+        path = safe_join(self.root, name)
+        if path is None or not os.path.isfile(path):
+            return None
+        return open(path, 'rb')
+
+
+class ZipMedia:
+    """Медиафайлы из zip-архива, загруженного вместе с данными"""
+
+    def __init__(self, file):
+        self.archive = zipfile.ZipFile(file)
+        self.names = set(self.archive.namelist())
+
+    def open(self, name):
+        return self.archive.open(name) if name in self.names else None
+
+
+# --- Экспорт ---
+
+def _batches(columns, id_column):
+    """Строки таблицы пакетами по id: память не зависит от размера таблицы"""
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*columns).where(id_column > last_id).order_by(id_column).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _grouped(statement):
+    groups = {}
+    for row in db.session.execute(statement):
+        groups.setdefault(row[0], []).append(row)
+    return groups
+
+
+def _export_news():
+    columns = [News.id, News.title, News.content, News.created_at]
+    for rows in _batches(columns, News.id):
+        ids = [row.id for row in rows]
+        images = _grouped(
+            select(NewsImage.news_id, NewsImage.image_path)
+            .where(NewsImage.news_id.in_(ids)).order_by(NewsImage.news_id, NewsImage.order, NewsImage.id)
+        )
+        videos = _grouped(
+            select(NewsVideo.news_id, NewsVideo.video_type, NewsVideo.video_url, NewsVideo.video_path,
+                   NewsVideo.title)
+            .where(NewsVideo.news_id.in_(ids)).order_by(NewsVideo.news_id, NewsVideo.order, NewsVideo.id)
+        )
+        for row in rows:
+            record = dict(row._mapping)
+            record['images'] = [image.image_path for image in images.get(row.id, [])]
+            record['videos'] = [
+                {'type': video.video_type, 'url': video.video_url, 'path': video.video_path, 'title': video.title}
+                for video in videos.get(row.id, [])
+            ]
+            yield record
+
+
+def export_records(kind):
+    """Генератор словарей для выгрузки"""
+    if kind == 'news':
+        yield from _export_news()
+        return
+    model = Event if kind == 'events' else Comment
+    columns = [getattr(model, field) for field in FIELDS[kind]]
+    for rows in _batches(columns, model.id):
+        for row in rows:
+            yield dict(row._mapping)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def export_lines(kind, fmt):
+    """Генератор строк NDJSON или CSV"""
+    if fmt == 'csv':
+        yield _csv_line(FIELDS[kind])
+        for record in export_records(kind):
+            yield _csv_line([
+                json.dumps(record[field], ensure_ascii=False) if field in NESTED_FIELDS
+                else _json_default(record[field]) if isinstance(record[field], datetime)
+                else record[field]
+                for field in FIELDS[kind]
+            ])
+    else:
+        for record in export_records(kind):
+            yield json.dumps(record, ensure_ascii=False, default=_json_default) + '\n'
+
+
+# --- Импорт ---
+
+def read_records(stream, fmt):
+    """Генератор (номер строки, словарь) из текстового потока"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            line = reader.line_num
+            for field in NESTED_FIELDS & record.keys():
+                try:
+                    record[field] = json.loads(record[field]) if record[field] else []
+                except ValueError:
+                    raise ArchiveError(f"поле {field} должно быть списком JSON", line)
+            # Пустые ячейки CSV означают отсутствие значения
+            yield line, {key: value for key, value in record.items() if value != ''}
+    else:
+        for line, raw in enumerate(stream, 1):
+            if not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                raise ArchiveError("некорректный JSON", line)
+            if not isinstance(record, dict):
+                raise ArchiveError("ожидается объект JSON", line)
+            yield line, record
+
+
+def _required(record, field, line):
+    value = record.get(field)
+    if value is None or value == '':
+        raise ArchiveError(f"не заполнено поле {field}", line)
+    return value
+
+
+def _datetime(record, field, line, default=None):
+    value = record.get(field)
+    if not value:
+        return default
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ArchiveError(f"поле {field} должно быть датой в формате ISO 8601", line)
+
+
+def _int(record, field, line):
+    try:
+        return int(_required(record, field, line))
+    except (TypeError, ValueError):
+        raise ArchiveError(f"поле {field} должно быть числом", line)
+
+
+class Importer:
+    """Импорт записей пакетами; каждый пакет - отдельная транзакция"""
+
+    def __init__(self, upload_folder, media=None, keep_ids=False):
+        self.upload_folder = upload_folder
+        self.video_folder = os.path.join(upload_folder, 'videos')
+        self.media = media
+        self.keep_ids = keep_ids
+
+    def _store_media(self, name, folder, prefix, line):
+        """Возвращает путь файла в хранилище ('uploads/...'), копируя его из источника при необходимости"""
+        filename = name[len(prefix):] if name.startswith(prefix) else None
+        if filename and os.path.isfile(os.path.join(folder, filename)):
+            # Файл уже в хранилище (например, выгрузка с этого же сервера)
+            return name
+
+        source = None
+        if self.media is not None:
+            source = self.media.open(name) or (self.media.open(filename) if filename else None)
+        if source is None:
+            raise ArchiveError(f"файл {name} не найден", line)
+        with source:
+            stored = storage.save_stream(source, folder, os.path.basename(name))
+        if folder == self.upload_folder:
+            schedule_variants(self.upload_folder, stored)
+        return f'{prefix}{stored}'
+
+    def _with_id(self, row, record, line):
+        if self.keep_ids and record.get('id') is not None:
+            row['id'] = _int(record, 'id', line)
+        return row
+
+    def _import_news(self, batch):
+        rows, media = [], []
+        for line, record in batch:
+            images = [self._store_media(name, self.upload_folder, 'uploads/', line)
+                      for name in record.get('images') or []]
+            videos = []
+            for video in record.get('videos') or []:
+                video_type = video.get('type') or ('uploaded' if video.get('path') else 'vk')
+                path = video.get('path')
+                if video_type == 'uploaded':
+                    if not path:
+                        raise ArchiveError("у загруженного видео не указан path", line)
+                    path = self._store_media(path, self.video_folder, 'uploads/videos/', line)
+                elif not video.get('url'):
+                    raise ArchiveError("у видео по ссылке не указан url", line)
+                videos.append((video_type, video.get('url'), path, video.get('title')))
+
+            rows.append(self._with_id({
+                'title': _required(record, 'title', line),
+                'content': _required(record, 'content', line),
+                'created_at': _datetime(record, 'created_at', line, datetime.utcnow()),
+                'image_count': len(images),
+                'video_count': len(videos),
+                'comment_count': 0,
+            }, record, line))
+            media.append((images, videos))
+
+        news_ids = db.session.execute(
+            insert(News).returning(News.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+        image_rows, video_rows = [], []
+        now = datetime.utcnow()
+        for news_id, (images, videos) in zip(news_ids, media):
+            image_rows += [{'news_id': news_id, 'image_path': path, 'order': order, 'created_at': now}
+                           for order, path in enumerate(images)]
+            for order, (video_type, url, path, title) in enumerate(videos):
+                # Массовая вставка минует события ORM, поэтому параметры встраивания считаем здесь
+                embed = resolve_embed(video_type, url)
+                video_rows.append({
+                    'news_id': news_id, 'video_type': video_type, 'video_url': url, 'video_path': path,
+                    'title': title or f"Видео {order + 1}", 'order': order, 'created_at': now,
+                    'embed_provider': embed.provider if embed else None,
+                    'embed_id': embed.embed_id if embed else None,
+                    'embed_url': embed.embed_url if embed else None,
+                })
+        if image_rows:
+            db.session.execute(insert(NewsImage), image_rows)
+        if video_rows:
+            db.session.execute(insert(NewsVideo), video_rows)
+
+    def _import_events(self, batch):
+        rows = []
+        for line, record in batch:
+            image_path = record.get('image_path')
+            if image_path:
+                image_path = self._store_media(image_path, self.upload_folder, 'uploads/', line)
+            rows.append(self._with_id({
+                'title': _required(record, 'title', line),
+                'description': _required(record, 'description', line),
+                'event_date': _datetime(record, 'event_date', line) or _required(record, 'event_date', line),
+                'location': record.get('location'),
+                'image_path': image_path,
+                'created_at': _datetime(record, 'created_at', line, datetime.utcnow()),
+            }, record, line))
+        db.session.execute(insert(Event), rows)
+
+    def _import_comments(self, batch):
+        rows = []
+        for line, record in batch:
+            rows.append(self._with_id({
+                'news_id': _int(record, 'news_id', line),
+                'author': _required(record, 'author', line),
+                'content': _required(record, 'content', line),
+                'created_at': _datetime(record, 'created_at', line, datetime.utcnow()),
+            }, record, line))
+
+        news_ids = {row['news_id'] for row in rows}
+        existing = set(db.session.execute(select(News.id).where(News.id.in_(news_ids))).scalars())
+        for (line, _), row in zip(batch, rows):
+            if row['news_id'] not in existing:
+                raise ArchiveError(f"новость {row['news_id']} не найдена", line)
+
+        db.session.execute(insert(Comment), rows)
+        # Счетчики обновляем одним запросом на новость, а не на комментарий
+        added = {}
+        for row in rows:
+            added[row['news_id']] = added.get(row['news_id'], 0) + 1
+        for news_id, count in added.items():
+            db.session.execute(
+                update(News).where(News.id == news_id).values(comment_count=News.comment_count + count)
+            )
+
+    def _sync_sequence(self, model):
+        # После вставки с явными id последовательность PostgreSQL нужно сдвинуть вперед
+        if db.engine.dialect.name == 'postgresql':
+            table = model.__tablename__
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 1)) FROM {table}"
+            ))
+            db.session.commit()
+
+    def run(self, kind, records):
+        """Импортирует записи; возвращает их количество"""
+        handler = {'news': self._import_news, 'events': self._import_events, 'comments': self._import_comments}[kind]
+        total = 0
+        try:
+            while True:
+                batch = list(islice(records, BATCH_SIZE))
+                if not batch:
+                    break
+                try:
+                    handler(batch)
+                    db.session.commit()
+                except IntegrityError as e:
+                    db.session.rollback()
+                    raise ArchiveError(f"строки {batch[0][0]}-{batch[-1][0]} конфликтуют с данными в базе: {e.orig}")
+                except Exception:
+                    db.session.rollback()
+                    raise
+                total += len(batch)
+        except ArchiveError as e:
+            # Предыдущие пакеты уже сохранены - сообщаем, сколько записей успело импортироваться
+            raise ArchiveError(f"{e} (импортировано записей: {total})", None) from e
+        finally:
+            if total:
+                invalidate_fallback_index()
+                if self.keep_ids:
+                    self._sync_sequence({'news': News, 'events': Event, 'comments': Comment}[kind])
+        return total
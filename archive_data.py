@@ -0,0 +1,68 @@
+"""Потоковая выгрузка и загрузка новостей, мероприятий и комментариев (NDJSON или CSV).
+
+    python archive_data.py export news > news.ndjson
+    python archive_data.py export comments --format csv --output comments.csv
+    python archive_data.py import news news.ndjson --media ./archive-media
+    python archive_data.py import comments comments.csv --keep-ids
+
+Файлы, на которые ссылаются записи (images, videos[].path, image_path), ищутся в папке
+--media; уже лежащие в хранилище файлы повторно не копируются. С --keep-ids сохраняются
+исходные id - так комментарии из той же выгрузки попадут к своим новостям.
+"""
+import argparse
+import sys
+
+from app import app, page_cache
+from archive import KINDS, FORMATS, ArchiveError, DirectoryMedia, Importer, export_lines, read_records
+
+
+def export_command(args):
+    output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        for line in export_lines(args.kind, args.format):
+            output.write(line)
+    finally:
+        if args.output:
+            output.close()
+
+
+def import_command(args):
+    fmt = args.format or ('csv' if args.path.lower().endswith('.csv') else 'ndjson')
+    media = DirectoryMedia(args.media) if args.media else None
+    importer = Importer(app.config['UPLOAD_FOLDER'], media, keep_ids=args.keep_ids)
+
+    with open(args.path, encoding='utf-8-sig', newline='') as stream:
+        try:
+            count = importer.run(args.kind, read_records(stream, fmt))
+        except ArchiveError as e:
+            sys.exit(f"Ошибка импорта: {e}")
+        finally:
+            page_cache.invalidate('events' if args.kind == 'events' else 'news')
+    print(f"Импортировано записей: {count}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Выгрузка и загрузка данных сайта')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='выгрузить данные')
+    export_parser.add_argument('kind', choices=KINDS)
+    export_parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    export_parser.add_argument('--output', help='файл (по умолчанию stdout)')
+    export_parser.set_defaults(handler=export_command)
+
+    import_parser = commands.add_parser('import', help='загрузить данные')
+    import_parser.add_argument('kind', choices=KINDS)
+    import_parser.add_argument('path', help='файл NDJSON или CSV')
+    import_parser.add_argument('--format', choices=FORMATS, help='по умолчанию - по расширению файла')
+    import_parser.add_argument('--media', help='папка с медиафайлами, на которые ссылаются записи')
+    import_parser.add_argument('--keep-ids', action='store_true', help='сохранить исходные id записей')
+    import_parser.set_defaults(handler=import_command)
+
+    args = parser.parse_args()
+    with app.app_context():
+        args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import tempfile
+
+from flask import abort, current_app, request, send_from_directory, url_for as flask_url_for
+from PIL import Image
+
+from images import JPEG_QUALITY
+
+try:
+    import brotli
+except ImportError:  # без пакета Brotli остается только gzip
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+# Файлы с хэшем содержимого в имени никогда не меняются
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Наибольшая сторона оптимизированного изображения в пикселях.
+# Логотип выводится высотой 120px - оставляем запас для экранов высокой плотности
+IMAGE_MAX_SIZE = {'vertical-logo.png': 480}
+DEFAULT_IMAGE_MAX_SIZE = 1920
+
+# Что имеет смысл сжимать: статика и динамические ответы
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.ico', '.json', '.txt', '.xml', '.map'}
+COMPRESSIBLE_MIMETYPES = {'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+                          'application/json', 'application/xml', 'image/svg+xml'}
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.asset-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp создает файл с правами 0600; статику может отдавать и прокси
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _optimize_image(name, data):
+    """Уменьшает и пересжимает JPEG/PNG; возвращает None, если формат не поддерживается"""
+    with Image.open(io.BytesIO(data)) as image:
+        if image.format not in ('JPEG', 'PNG'):
+            return None
+        image_format = image.format
+        max_size = IMAGE_MAX_SIZE.get(name, DEFAULT_IMAGE_MAX_SIZE)
+        image.load()
+        if max(image.size) > max_size:
+            image.thumbnail((max_size, max_size), Image.LANCZOS)
+        output = io.BytesIO()
+        # Метаданные (EXIF, ICC-комментарии) не сохраняем - браузеру они не нужны
+        if image_format == 'JPEG':
+            image.convert('RGB').save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        else:
+            # PNG в статике - логотипы и иконки: палитры из 256 цветов для них достаточно
+            if image.mode in ('RGB', 'RGBA'):
+                image = image.quantize(256, method=Image.Quantize.FASTOCTREE)
+            image.save(output, 'PNG', optimize=True)
+    return output.getvalue()
+
+
+def compress(data, encoding, level=9):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if level >= 9 else 5)
+    # mtime=0: одинаковый вход дает одинаковый архив
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(encodings):
+    """Лучшее из encodings, которое принимает клиент (по Accept-Encoding), или None"""
+    best = None
+    best_quality = 0
+    for encoding in encodings:
+        quality = request.accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def build(static_folder, output_folder, force=False):
+    """Собирает статику: оптимизирует изображения, пишет копии с хэшем в имени и сжатые варианты.
+
+    Сборка инкрементальная: файл пересобирается, только если изменился исходник.
+    Возвращает манифест {'исходное имя': {'path': 'имя с хэшем', 'source': ..., 'size': ...}}.
+    """
+    manifest_path = os.path.join(output_folder, MANIFEST_NAME)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            previous = json.load(f)
+    except FileNotFoundError:
+        previous = {}
+
+    entries = {}
+    for root, _, files in os.walk(static_folder):
+        for filename in sorted(files):
+            source_path = os.path.join(root, filename)
+            name = os.path.relpath(source_path, static_folder).replace(os.sep, '/')
+            with open(source_path, 'rb') as f:
+                data = f.read()
+            source_digest = hashlib.sha256(data).hexdigest()
+
+            entry = previous.get(name)
+            if (not force and entry and entry['source'] == source_digest
+                    and os.path.exists(os.path.join(output_folder, entry['path']))):
+                entries[name] = entry
+                continue
+
+            stem, extension = os.path.splitext(name)
+            if extension.lower() in ('.jpg', '.jpeg', '.png'):
+                optimized = _optimize_image(name, data)
+                if optimized is not None and len(optimized) < len(data):
+                    data = optimized
+
+            path = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+            _write(os.path.join(output_folder, path), data)
+            if extension.lower() in COMPRESSIBLE_EXTENSIONS:
+                for encoding in available_encodings():
+                    compressed = compress(data, encoding)
+                    if len(compressed) < len(data):
+                        _write(os.path.join(output_folder, path + ENCODING_SUFFIXES[encoding]), compressed)
+            entries[name] = {'path': path, 'source': source_digest, 'size': len(data)}
+
+    _write(manifest_path, json.dumps(entries, indent=2, ensure_ascii=False).encode('utf-8'))
+    return entries
+
+
+def prune(output_folder, manifest):
+    """Удаляет собранные файлы, которых нет в манифесте; возвращает их число.
+
+    Старые версии по умолчанию не удаляются: закэшированные страницы могут
+    ссылаться на них, пока не истечет их срок.
+    """
+    keep = {MANIFEST_NAME}
+    for entry in manifest.values():
+        keep.add(entry['path'])
+        keep.update(entry['path'] + suffix for suffix in ENCODING_SUFFIXES.values())
+    removed = 0
+    for root, _, files in os.walk(output_folder):
+        for filename in files:
+            path = os.path.join(root, filename)
+            if os.path.relpath(path, output_folder).replace(os.sep, '/') not in keep:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+class Assets:
+    """Статика с хэшем в имени и сжатие ответов.
+
+    url_for('static', filename=...) в шаблонах подставляет версию файла с хэшем
+    из манифеста сборки, если она есть; такие файлы отдаются по /assets/ с
+    Cache-Control: immutable и заранее сжатыми вариантами (br, gzip). HTML и
+    другие текстовые ответы сжимаются на лету по Accept-Encoding клиента.
+    """
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_DIR', '/data/cache/assets')
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        self.manifest = self._load(app.config['ASSETS_DIR'])
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.send)
+        app.jinja_env.globals['url_for'] = self.url_for
+        app.after_request(self.compress_response)
+        app.extensions['assets'] = self
+
+    @staticmethod
+    def _load(folder):
+        try:
+            with open(os.path.join(folder, MANIFEST_NAME), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def build(self, app, force=False):
+        self.manifest = build(app.static_folder, app.config['ASSETS_DIR'], force=force)
+        return self.manifest
+
+    def url_for(self, endpoint, **values):
+        """url_for, который для статики возвращает адрес версии с хэшем"""
+        if endpoint == 'static':
+            entry = self.manifest.get(values.get('filename'))
+            if entry is not None:
+                values['filename'] = entry['path']
+                endpoint = 'assets'
+        return flask_url_for(endpoint, **values)
+
+    def send(self, filename):
+        folder = current_app.config['ASSETS_DIR']
+        if filename == MANIFEST_NAME:
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encodings = [encoding for encoding in available_encodings()
+                     if os.path.exists(os.path.join(folder, filename + ENCODING_SUFFIXES[encoding]))]
+        encoding = negotiate_encoding(encodings)
+
+        if encoding is None:
+            response = send_from_directory(folder, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        else:
+            response = send_from_directory(folder, filename + ENCODING_SUFFIXES[encoding], mimetype=mimetype,
+                                           max_age=IMMUTABLE_MAX_AGE)
+            response.headers['Content-Encoding'] = encoding
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    @staticmethod
+    def compress_response(response):
+        """Сжимает текстовые ответы (HTML, JSON, XML) по Accept-Encoding клиента"""
+        config = current_app.config
+        if (not config['COMPRESS_ENABLED']
+                or response.direct_passthrough
+                or response.is_streamed
+                or response.status_code < 200
+                or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        encoding = negotiate_encoding(available_encodings())
+        if encoding is None:
+            return response
+
+        response.set_data(compress(data, encoding, config['COMPRESS_LEVEL']))
+        response.headers['Content-Encoding'] = encoding
+        # ETag посчитан по несжатому телу: помечаем его слабым, тогда If-None-Match
+        # по-прежнему совпадает, а кэши не путают сжатое и несжатое представления
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
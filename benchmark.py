@@ -0,0 +1,241 @@
+"""Бенчмарк маршрутов с сохраненным эталоном.
+
+Заполняет отдельную базу (BENCHMARK_DATABASE_URL, по умолчанию временный SQLite)
+настраиваемым объемом данных, гоняет маршруты через тестовый клиент Flask и
+записывает задержки p50/p99, пропускную способность, число SQL-запросов на запрос
+и пиковую память в JSON. Результаты сравниваются с benchmark_baseline.json.
+
+    python benchmark.py                      # прогон и сравнение с эталоном
+    python benchmark.py --update-baseline    # перезаписать эталон
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BENCHMARK_DATABASE_URL = os.environ.get('BENCHMARK_DATABASE_URL') or \
+    'sqlite:///' + os.path.join(tempfile.gettempdir(), 'chest_benchmark.db')
+
+# Конфигурация читает переменные окружения при импорте приложения
+os.environ['DATABASE_URL'] = BENCHMARK_DATABASE_URL
+os.environ.setdefault('OUTBOX_SENDER_ENABLED', '0')
+os.environ.setdefault('PAGE_CACHE_ENABLED', '0')
+
+from sqlalchemy import event, insert
+
+from app import app, db
+from models import News, NewsImage, NewsVideo, Comment, Event, reconcile_news_counters
+from search import create_search_index
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+BATCH_SIZE = 5000
+
+# Допустимое ухудшение относительно эталона
+LATENCY_TOLERANCE = 0.25
+# p99 на общих машинах сильно шумит, поэтому по нему только предупреждаем
+P99_WARNING_TOLERANCE = 1.0
+# Быстрые маршруты шумят сильнее процентов - мелкие абсолютные отклонения не считаем
+LATENCY_MIN_DELTA_MS = 2.0
+MEMORY_TOLERANCE = 0.25
+
+
+def seed(news_count, comments_per_busy_news, event_count):
+    """Заполняет базу; первая новость получает много комментариев"""
+    db.drop_all()
+    db.create_all()
+    create_search_index()
+
+    now = datetime.utcnow()
+    topics = ['турнир', 'шахматы', 'клуб', 'лекция', 'выставка', 'концерт']
+
+    def insert_batches(model, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                db.session.execute(insert(model), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(model), batch)
+
+    insert_batches(News, (
+        dict(title=f'Новость {i}', content=f'Текст новости {i} про {topics[i % len(topics)]} ' * 20,
+             created_at=now - timedelta(minutes=i))
+        for i in range(news_count)
+    ))
+    insert_batches(NewsImage, (
+        dict(news_id=news_id, image_path=f'uploads/bench-{news_id}-{order}.jpg', order=order, created_at=now)
+        for news_id in range(1, news_count + 1) for order in range(3)
+    ))
+    insert_batches(NewsVideo, (
+        dict(news_id=news_id, video_url=f'https://rutube.ru/video/bench{news_id}/', video_type='rutube',
+             embed_provider='rutube', embed_id=f'bench{news_id}', embed_url=f'https://rutube.ru/play/embed/bench{news_id}',
+             title='Видео', order=0, created_at=now)
+        for news_id in range(1, news_count + 1, 4)
+    ))
+    insert_batches(Comment, (
+        dict(news_id=1, author=f'Автор {i}', content=f'Комментарий {i}', created_at=now - timedelta(seconds=i))
+        for i in range(comments_per_busy_news)
+    ))
+    insert_batches(Event, (
+        dict(title=f'Мероприятие {i}', description=f'Описание: {topics[i % len(topics)]} ' * 10,
+             event_date=now + timedelta(hours=i - event_count // 2), location=f'Зал {i % 20}', created_at=now)
+        for i in range(event_count)
+    ))
+    db.session.commit()
+    reconcile_news_counters()
+
+
+ROUTES = [
+    ('index', '/'),
+    ('news', '/news'),
+    ('news_detail', '/news/1'),
+    ('events', '/events'),
+    ('search', '/search?q=турнир'),
+    ('about', '/about'),
+]
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(requests_per_route, warmup):
+    client = app.test_client()
+    query_counter = {'count': 0}
+
+    def count_query(*args, **kwargs):
+        query_counter['count'] += 1
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+
+    results = {}
+    for name, url in ROUTES:
+        for _ in range(warmup):
+            client.get(url)
+
+        # Сборка мусора от предыдущего маршрута не должна попадать в замеры этого
+        gc.collect()
+        latencies = []
+        query_counter['count'] = 0
+        started = time.perf_counter()
+        for _ in range(requests_per_route):
+            request_started = time.perf_counter()
+            response = client.get(url)
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            if response.status_code != 200:
+                sys.exit(f"{url}: код ответа {response.status_code}")
+        elapsed = time.perf_counter() - started
+        queries = query_counter['count'] / requests_per_route
+
+        # Память меряем отдельным проходом: tracemalloc заметно замедляет запросы
+        tracemalloc.start()
+        client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[name] = {
+            'url': url,
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p99_ms': round(_percentile(latencies, 99), 3),
+            'throughput_rps': round(requests_per_route / elapsed, 1),
+            'queries_per_request': round(queries, 2),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+        print(f"{name:12} p50={results[name]['p50_ms']:8.2f}ms p99={results[name]['p99_ms']:8.2f}ms "
+              f"rps={results[name]['throughput_rps']:8.1f} sql={queries:5.1f} "
+              f"mem={results[name]['peak_memory_kb']:8.1f}KB")
+
+    with app.app_context():
+        event.remove(db.engine, 'before_cursor_execute', count_query)
+    return results
+
+
+def compare(results, baseline):
+    """Возвращает (регрессии, предупреждения) относительно эталона"""
+    regressions = []
+    warnings = []
+    for name, current in results.items():
+        reference = baseline.get('routes', {}).get(name)
+        if reference is None:
+            continue
+        delta = current['p50_ms'] - reference['p50_ms']
+        if delta > reference['p50_ms'] * LATENCY_TOLERANCE and delta > LATENCY_MIN_DELTA_MS:
+            regressions.append(f"{name}: p50 {reference['p50_ms']}ms -> {current['p50_ms']}ms")
+        delta = current['p99_ms'] - reference['p99_ms']
+        if delta > reference['p99_ms'] * P99_WARNING_TOLERANCE and delta > LATENCY_MIN_DELTA_MS:
+            warnings.append(f"{name}: p99 {reference['p99_ms']}ms -> {current['p99_ms']}ms")
+        # Число запросов детерминировано - любое увеличение считается регрессией
+        if current['queries_per_request'] > reference['queries_per_request']:
+            regressions.append(f"{name}: SQL-запросов {reference['queries_per_request']} -> "
+                               f"{current['queries_per_request']}")
+        if current['peak_memory_kb'] > reference['peak_memory_kb'] * (1 + MEMORY_TOLERANCE):
+            regressions.append(f"{name}: память {reference['peak_memory_kb']}KB -> {current['peak_memory_kb']}KB")
+    return regressions, warnings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк маршрутов приложения')
+    parser.add_argument('--news', type=int, default=2000, help='количество новостей')
+    parser.add_argument('--comments', type=int, default=5000, help='комментариев у первой новости')
+    parser.add_argument('--events', type=int, default=2000, help='количество мероприятий')
+    parser.add_argument('--requests', type=int, default=200, help='запросов на маршрут')
+    parser.add_argument('--warmup', type=int, default=10, help='прогревочных запросов на маршрут')
+    parser.add_argument('--output', default='benchmark_results.json', help='файл с результатами')
+    parser.add_argument('--update-baseline', action='store_true', help='сохранить результаты как эталон')
+    parser.add_argument('--no-seed', action='store_true', help='не пересоздавать данные')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if not args.no_seed:
+            print(f"Заполнение: {args.news} новостей, {args.comments} комментариев, {args.events} мероприятий...")
+            seed(args.news, args.comments, args.events)
+        dialect = db.engine.dialect.name
+
+    results = run(args.requests, args.warmup)
+    report = {
+        'dataset': {'news': args.news, 'comments': args.comments, 'events': args.events, 'database': dialect},
+        'requests_per_route': args.requests,
+        'routes': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"Эталон обновлен: {BASELINE_PATH}")
+        return
+
+    if not os.path.exists(BASELINE_PATH):
+        print("Эталон не найден - запустите с --update-baseline")
+        return
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    if baseline.get('dataset') != report['dataset']:
+        print("Предупреждение: эталон снят на другом наборе данных, сравнение может быть неточным")
+
+    regressions, warnings = compare(results, baseline)
+    for warning in warnings:
+        print(f"Предупреждение: {warning}")
+    if regressions:
+        print("\nРегрессии производительности:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("\nРегрессий относительно эталона нет")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""Сборка статики: оптимизация изображений, копии с хэшем в имени и сжатые варианты.
+
+    python build_assets.py           # собрать измененные файлы из static/
+    python build_assets.py --force   # пересобрать все файлы
+    python build_assets.py --prune   # удалить старые версии, которых нет в манифесте
+
+Результат пишется в ASSETS_DIR вместе с manifest.json; по нему url_for('static', ...)
+в шаблонах подставляет адрес /assets/<имя>.<хэш>.<расширение>. При запуске через
+gunicorn сборка выполняется автоматически в мастер-процессе (см. gunicorn.conf.py).
+"""
+import argparse
+import os
+
+from app import app, assets as app_assets
+from assets import prune
+from media_gc import format_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сборка статических файлов')
+    parser.add_argument('--force', action='store_true', help='пересобрать все файлы, даже неизмененные')
+    parser.add_argument('--prune', action='store_true', help='удалить собранные файлы, которых нет в манифесте')
+    args = parser.parse_args()
+
+    manifest = app_assets.build(app, force=args.force)
+    for name, entry in manifest.items():
+        source_size = os.path.getsize(os.path.join(app.static_folder, name))
+        print(f"{name} -> {entry['path']} ({format_size(source_size)} -> {format_size(entry['size'])})")
+    if args.prune:
+        print(f"Удалено старых файлов: {prune(app.config['ASSETS_DIR'], manifest)}")
+
+
+if __name__ == '__main__':
+    main()
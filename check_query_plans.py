@@ -0,0 +1,205 @@
+"""Проверка планов горячих запросов на большом наборе данных.
+
+Скрипт заполняет ОТДЕЛЬНУЮ базу PostgreSQL (QUERY_PLAN_DATABASE_URL) реалистичным
+объемом данных, прогоняет горячие запросы приложения через EXPLAIN и завершается
+с ненулевым кодом, если нужный индекс отсутствует или запрос перешел на Seq Scan.
+
+    QUERY_PLAN_DATABASE_URL=postgresql://localhost/chest_plans python check_query_plans.py
+
+Объем данных задается переменными PLAN_NEWS, PLAN_EVENTS, PLAN_COMMENTS, PLAN_USERS.
+Вместе с остальными тестами проверку запускает tests/test_query_plans.py, если
+задан QUERY_PLAN_DATABASE_URL.
+"""
+import json
+import os
+import sys
+from datetime import datetime
+
+PLAN_DATABASE_URL = os.environ.get('QUERY_PLAN_DATABASE_URL')
+if not PLAN_DATABASE_URL:
+    sys.exit("Укажите QUERY_PLAN_DATABASE_URL - база будет очищена и заполнена тестовыми данными")
+
+# Конфигурация читает DATABASE_URL при импорте приложения
+os.environ['DATABASE_URL'] = PLAN_DATABASE_URL
+os.environ.setdefault('OUTBOX_SENDER_ENABLED', '0')
+
+from sqlalchemy import func, text
+
+from app import app, db
+from models import News, NewsImage, NewsVideo, Comment, Event, User, reconcile_news_counters
+from pagination import KeysetPagination
+from search import create_search_index, search_statement
+
+NEWS_COUNT = int(os.environ.get('PLAN_NEWS', 20000))
+EVENT_COUNT = int(os.environ.get('PLAN_EVENTS', 20000))
+COMMENT_COUNT = int(os.environ.get('PLAN_COMMENTS', 300000))
+USER_COUNT = int(os.environ.get('PLAN_USERS', 1000))
+
+# Таблицы, на которых полный просмотр в горячем запросе считается регрессией
+LARGE_TABLES = {'news', 'news_image', 'news_video', 'comment', 'event', 'user'}
+
+
+def seed():
+    """Заполняет базу средствами generate_series - быстро и без загрузки в Python"""
+    db.drop_all()
+    db.create_all()
+    create_search_index()
+
+    db.session.execute(text("""
+        INSERT INTO news (title, content, created_at, comment_count, image_count, video_count)
+        SELECT 'Новость ' || g,
+               'Текст новости номер ' || g || ' про турнир, шахматы, клуб и мероприятия города',
+               now() - (g || ' minutes')::interval, 0, 0, 0
+        FROM generate_series(1, :n) AS g
+    """), {'n': NEWS_COUNT})
+    db.session.execute(text("""
+        INSERT INTO news_image (news_id, image_path, created_at, "order")
+        SELECT n.id, 'uploads/' || md5(n.id::text || '-' || i) || '.jpg', n.created_at, i
+        FROM news n, generate_series(0, 2) AS i
+    """))
+    db.session.execute(text("""
+        INSERT INTO news_video (news_id, video_url, video_type, title, created_at, "order")
+        SELECT n.id, 'https://rutube.ru/video/' || md5(n.id::text) || '/', 'rutube', 'Видео', n.created_at, 0
+        FROM news n WHERE n.id % 4 = 0
+    """))
+    # Комментарии распределены неравномерно: к свежим новостям их больше
+    db.session.execute(text("""
+        INSERT INTO comment (news_id, author, content, created_at)
+        SELECT 1 + floor(power(random(), 3) * :news)::int, 'Автор ' || g, 'Комментарий ' || g,
+               now() - (random() * 365 || ' days')::interval
+        FROM generate_series(1, :n) AS g
+    """), {'n': COMMENT_COUNT, 'news': NEWS_COUNT})
+    db.session.execute(text("""
+        INSERT INTO event (title, description, event_date, location, created_at)
+        SELECT 'Мероприятие ' || g, 'Описание мероприятия ' || g || ' - открытый турнир по шахматам',
+               now() + ((g - :n / 2) || ' hours')::interval, 'Зал ' || (g % 20), now()
+        FROM generate_series(1, :n) AS g
+    """), {'n': EVENT_COUNT})
+    db.session.execute(text("""
+        INSERT INTO "user" (username, email, password_hash, is_admin)
+        SELECT 'user' || g, 'user' || g || '@example.com', 'x', g = 1
+        FROM generate_series(1, :n) AS g
+    """), {'n': USER_COUNT})
+    db.session.commit()
+    reconcile_news_counters()
+
+    # Актуальная статистика для планировщика
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.exec_driver_sql('ANALYZE')
+
+
+def hot_queries():
+    """Горячие запросы приложения: (название, запрос, индексы, которые должны использоваться)"""
+    now = datetime.now()
+    busy_news_id = 1
+    deep_news = News.query.order_by(News.created_at.asc(), News.id.asc()).offset(NEWS_COUNT // 2).first()
+    deep_comment = Comment.query.filter_by(news_id=busy_news_id) \
+        .order_by(Comment.created_at.asc(), Comment.id.asc()).first()
+
+    return [
+        ('Новости, первая страница',
+         KeysetPagination.keyset_query(News.list_query(), [News.created_at, News.id]).limit(7),
+         ['ix_news_created_at_id', 'ix_news_image_news_id_order']),
+        ('Новости, глубокая страница',
+         KeysetPagination.keyset_query(News.list_query(), [News.created_at, News.id],
+                                       [deep_news.created_at, deep_news.id]).limit(7),
+         ['ix_news_created_at_id']),
+        ('Новости на главной',
+         News.list_query().order_by(News.created_at.desc()).limit(3),
+         ['ix_news_created_at_id']),
+        ('Комментарии, первая страница',
+         KeysetPagination.keyset_query(Comment.query.filter_by(news_id=busy_news_id),
+                                       [Comment.created_at, Comment.id]).limit(11),
+         ['ix_comment_news_id_created_at_id']),
+        ('Комментарии, глубокая страница',
+         KeysetPagination.keyset_query(Comment.query.filter_by(news_id=busy_news_id),
+                                       [Comment.created_at, Comment.id],
+                                       [deep_comment.created_at, deep_comment.id]).limit(11),
+         ['ix_comment_news_id_created_at_id']),
+        ('Галерея новости',
+         NewsImage.query.filter_by(news_id=busy_news_id).order_by(NewsImage.order, NewsImage.id),
+         ['ix_news_image_news_id_order']),
+        ('Видео новости',
+         NewsVideo.query.filter_by(news_id=4).order_by(NewsVideo.order, NewsVideo.id),
+         ['ix_news_video_news_id_order']),
+        ('Предстоящие мероприятия',
+         KeysetPagination.keyset_query(Event.query.filter(Event.event_date >= now),
+                                       [Event.event_date, Event.id], descending=False).limit(7),
+         ['ix_event_event_date_id']),
+        ('Прошедшие мероприятия',
+         Event.query.filter(Event.event_date < now).order_by(Event.event_date.desc()).limit(10),
+         ['ix_event_event_date_id']),
+        ('Поиск по новостям',
+         search_statement(News, 'турнир', News.created_at, 10),
+         ['ix_news_search_vector']),
+        ('Поиск по мероприятиям',
+         search_statement(Event, 'шахматы', Event.event_date, 10),
+         ['ix_event_search_vector']),
+        ('Вход: поиск пользователя',
+         User.query.filter_by(username='user500'),
+         ['user_username_key']),
+        ('Админ-панель: предстоящие',
+         db.session.query(func.count(Event.id)).filter(Event.event_date >= now),
+         ['ix_event_event_date_id']),
+    ]
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+def explain(statement):
+    statement = getattr(statement, 'statement', statement)
+    compiled = statement.compile(dialect=db.engine.dialect)
+    connection = db.session.connection()
+    result = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params).scalar()
+    plan = result if isinstance(result, list) else json.loads(result)
+    return plan[0]['Plan']
+
+
+def check_indexes(required):
+    existing = {name for (name,) in db.session.execute(text('SELECT indexname FROM pg_indexes'))}
+    return sorted(set(required) - existing)
+
+
+def main():
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            sys.exit("Проверка планов поддерживается только для PostgreSQL")
+
+        if '--no-seed' not in sys.argv:
+            print(f"Заполнение: {NEWS_COUNT} новостей, {EVENT_COUNT} мероприятий, {COMMENT_COUNT} комментариев...")
+            seed()
+
+        queries = hot_queries()
+        failures = []
+
+        missing = check_indexes([index for _, _, indexes in queries for index in indexes])
+        for index in missing:
+            failures.append(f"Отсутствует индекс {index}")
+
+        for name, statement, indexes in queries:
+            nodes = list(_plan_nodes(explain(statement)))
+            used = {node['Index Name'] for node in nodes if 'Index Name' in node}
+            seq_scans = {node['Relation Name'] for node in nodes
+                         if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in LARGE_TABLES}
+
+            problems = [f"не используется {index}" for index in indexes if index not in used]
+            problems += [f"Seq Scan по {table}" for table in sorted(seq_scans)]
+            status = 'OK ' if not problems else 'FAIL'
+            print(f"[{status}] {name}: {', '.join(sorted(used)) or 'без индексов'}")
+            failures.extend(f"{name}: {problem}" for problem in problems)
+
+        if failures:
+            print("\nРегрессии планов запросов:")
+            for failure in failures:
+                print(f"  - {failure}")
+            sys.exit(1)
+
+        print("\nВсе горячие запросы используют индексы")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import fcntl
+import json
+import os
+import re
+import secrets
+
+from werkzeug.utils import secure_filename
+
+import storage
+
+# Незавершенные загрузки лежат рядом с видео, чтобы финальный rename был атомарным
+PARTIAL_DIR = '.partial'
+# Размер блока, которым тело запроса переписывается на диск
+BUFFER_SIZE = 1024 * 1024
+
+_UPLOAD_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+
+class UploadError(Exception):
+    """Ошибка протокола загрузки с HTTP-кодом ответа"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _partial_folder(video_folder):
+    folder = os.path.join(video_folder, PARTIAL_DIR)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def _data_path(video_folder, upload_id):
+    return os.path.join(_partial_folder(video_folder), upload_id)
+
+
+def _meta_path(video_folder, upload_id):
+    return os.path.join(_partial_folder(video_folder), f'{upload_id}.json')
+
+
+def _is_int(value):
+    # bool - подкласс int, но {"size": true} размером не считаем
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def start_upload(video_folder, news_id, filename, size, title=None):
+    """Регистрирует новую загрузку и возвращает ее описание"""
+    if filename is not None and not isinstance(filename, str):
+        raise UploadError('Имя файла должно быть строкой')
+    if title is not None and not isinstance(title, str):
+        raise UploadError('Название должно быть строкой')
+    filename = secure_filename(filename or '')
+    if not filename:
+        raise UploadError('Не указано имя файла')
+    if size is None:
+        raise UploadError('Не указан размер файла')
+    if not _is_int(size) or size <= 0:
+        raise UploadError('Размер файла должен быть положительным целым числом')
+
+    upload = {
+        'upload_id': secrets.token_hex(16),
+        'news_id': news_id,
+        'filename': filename,
+        'size': size,
+        'title': title,
+    }
+    open(_data_path(video_folder, upload['upload_id']), 'wb').close()
+    with open(_meta_path(video_folder, upload['upload_id']), 'w') as f:
+        json.dump(upload, f)
+    return upload
+
+
+def load_upload(video_folder, upload_id):
+    """Возвращает описание загрузки или None, если такой нет"""
+    if not _UPLOAD_ID_RE.fullmatch(upload_id or ''):
+        return None
+    try:
+        with open(_meta_path(video_folder, upload_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def upload_offset(video_folder, upload):
+    """Сколько байт уже получено - с этого места клиент продолжает загрузку"""
+    try:
+        return os.path.getsize(_data_path(video_folder, upload['upload_id']))
+    except FileNotFoundError:
+        # Параллельный запрос уже завершил загрузку и перенес файл в хранилище
+        return upload['size']
+
+
+def write_chunk(video_folder, upload, offset, stream):
+    """Дописывает очередной фрагмент из потока запроса, не держа его в памяти целиком"""
+    if not _is_int(offset) or offset < 0:
+        raise UploadError('Смещение должно быть неотрицательным целым числом')
+    try:
+        # 'r+b', а не 'ab': файл завершенной загрузки не должен создаваться заново
+        f = open(_data_path(video_folder, upload['upload_id']), 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Загрузка уже завершена', 409)
+    with f:
+        # Блокировка защищает от параллельной записи одного файла разными воркерами
+        fcntl.flock(f, fcntl.LOCK_EX)
+        # Пока ждали блокировку, finish_upload мог перенести файл в хранилище
+        if not os.path.exists(_meta_path(video_folder, upload['upload_id'])):
+            raise UploadError('Загрузка уже завершена', 409)
+        current = f.seek(0, os.SEEK_END)
+        if offset != current:
+            raise UploadError(f'Неверное смещение: ожидалось {current}', 409)
+
+        while True:
+            block = stream.read(BUFFER_SIZE)
+            if not block:
+                break
+            if current + len(block) > upload['size']:
+                f.truncate(offset)
+                raise UploadError('Получено больше данных, чем заявлено', 413)
+            f.write(block)
+            current += len(block)
+
+        f.flush()
+        os.fsync(f.fileno())
+        return current
+
+
+def finish_upload(video_folder, upload):
+    """Переносит полностью загруженный файл в хранилище видео и возвращает его имя.
+
+    Возвращает None, если загрузку уже завершил другой запрос (например,
+    повтор последнего фрагмента после тайм-аута).
+    """
+    data_path = _data_path(video_folder, upload['upload_id'])
+    try:
+        f = open(data_path, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        # Та же блокировка, что в write_chunk: завершает загрузку только один запрос
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # Описание удаляется первым: после этого загрузку больше никто не продолжит и не завершит
+            os.remove(_meta_path(video_folder, upload['upload_id']))
+        except FileNotFoundError:
+            return None
+        return storage.store_file(data_path, video_folder, upload['filename'])
@@ -0,0 +1,37 @@
+"""Удаление медиафайлов, на которые не ссылается ни одна запись.
+
+    python collect_media.py                   # только отчет (dry-run)
+    python collect_media.py --delete          # удалить файлы без ссылок
+    python collect_media.py --grace-hours 48  # не трогать файлы моложе 48 часов
+
+Удаляются изображения, их варианты и видео без ссылок в NewsImage, Event и NewsVideo,
+остатки прерванных сохранений и заброшенные незавершенные загрузки видео.
+"""
+import argparse
+
+from app import app
+from media_gc import CATEGORIES, collect, format_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сборка неиспользуемых медиафайлов')
+    parser.add_argument('--delete', action='store_true', help='удалить файлы (по умолчанию только отчет)')
+    parser.add_argument('--grace-hours', type=float, default=24, help='минимальный возраст удаляемого файла')
+    args = parser.parse_args()
+
+    with app.app_context():
+        report = collect(app.config['UPLOAD_FOLDER'], grace=args.grace_hours * 3600, dry_run=not args.delete)
+
+    for category, label in CATEGORIES.items():
+        stats = report['categories'][category]
+        print(f"{label}: {stats['files']} файлов, {format_size(stats['bytes'])}; "
+              f"без ссылок: {stats['orphan_files']} ({format_size(stats['orphan_bytes'])})")
+    print(f"Занято: {format_size(report['used_bytes'])}, можно освободить: {format_size(report['reclaimable_bytes'])}")
+    if args.delete:
+        print(f"Удалено файлов: {report['deleted_files']}, освобождено: {format_size(report['deleted_bytes'])}")
+    else:
+        print("Запустите с --delete, чтобы удалить файлы")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""Предварительная компиляция шаблонов Jinja в байткод на постоянном диске.
+
+    python compile_templates.py          # скомпилировать все шаблоны из templates/
+    python compile_templates.py --clear  # удалить старый байткод и скомпилировать заново
+
+Запускается при сборке или перед перезапуском: воркеры загружают готовый байткод
+из TEMPLATE_CACHE_DIR вместо разбора шаблонов на первых запросах. При запуске через
+gunicorn шаблоны дополнительно компилируются в мастер-процессе (см. gunicorn.conf.py).
+"""
+import argparse
+import time
+
+from app import app
+from template_cache import TemplateCache
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Компиляция шаблонов Jinja')
+    parser.add_argument('--clear', action='store_true', help='удалить сохраненный байткод перед компиляцией')
+    args = parser.parse_args()
+
+    if args.clear:
+        TemplateCache.clear(app)
+
+    started = time.perf_counter()
+    names = TemplateCache.precompile(app)
+    print(f"Скомпилировано шаблонов: {len(names)} за {time.perf_counter() - started:.2f} с "
+          f"-> {app.config['TEMPLATE_CACHE_DIR']}")
+
+
+if __name__ == '__main__':
+    main()
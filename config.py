@@ -8,6 +8,10 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key'
 
     PREFERRED_URL_SCHEME = 'https'
+    # Канонический адрес сайта (https://example.ru) для абсолютных ссылок в лентах,
+    # карте сайта и календаре: эти файлы собираются один раз для всех клиентов,
+    # поэтому адрес нельзя брать из заголовков запроса
+    SITE_URL = os.environ.get('SITE_URL')
     PROXY_FIX = True
 
     DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -29,4 +33,76 @@ class Config:
     MAIL_USE_SSL = os.environ.get('MAIL_USE_SSL', False)
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
-    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', MAIL_USERNAME)
\ No newline at end of file
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', MAIL_USERNAME)
+
+    # Кэш страниц для анонимных посетителей
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', '1') == '1'
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR', '/data/cache/pages')
+    PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 300))
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 512))
+
+
+    # Отдача медиафайлов фронт-прокси: 'x-accel' (nginx) или 'x-sendfile' (Apache, lighttpd)
+    MEDIA_OFFLOAD = os.environ.get('MEDIA_OFFLOAD')
+    # internal-location nginx, указывающий на папку загрузок (alias /data/uploads/)
+    MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-uploads')
+    USE_X_SENDFILE = MEDIA_OFFLOAD == 'x-sendfile'
+
+    # Фоновая отправка писем из очереди (0 - только скрипт send_outbox.py)
+    OUTBOX_SENDER_ENABLED = os.environ.get('OUTBOX_SENDER_ENABLED', '1') == '1'
+
+    # Замеры запросов: Server-Timing, метрики Prometheus и журнал медленных SQL-запросов
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 200))
+    # Токен для сборщика метрик (заголовок Authorization: Bearer <токен>)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Общая папка, через которую воркеры gunicorn складывают метрики для /admin/metrics
+    METRICS_DIR = os.environ.get('METRICS_DIR', '/data/cache/metrics')
+
+    # Пул соединений: проверка перед выдачей и пересоздание старых соединений
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+    if not DATABASE_URL.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS.update(
+            pool_size=int(os.environ.get('DB_POOL_SIZE', 5)),
+            max_overflow=int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10)),
+            pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        )
+
+    # Реплика только для чтения (необязательно): в нее идут GET-запросы публичных страниц
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    if DATABASE_REPLICA_URL:
+        if DATABASE_REPLICA_URL.startswith('postgres://'):
+            DATABASE_REPLICA_URL = DATABASE_REPLICA_URL.replace('postgres://', 'postgresql://', 1)
+        SQLALCHEMY_BINDS = {'replica': DATABASE_REPLICA_URL}
+    # Сколько секунд после записи читать из основной базы (отставание реплики)
+    DATABASE_REPLICA_LAG = int(os.environ.get('DATABASE_REPLICA_LAG', 5))
+    DATABASE_REPLICA_MARKER = os.environ.get('DATABASE_REPLICA_MARKER', '/data/cache/last_write')
+
+    # Кэш пользователей для Flask-Login (секунды жизни записи)
+    USER_CACHE_ENABLED = os.environ.get('USER_CACHE_ENABLED', '1') == '1'
+    USER_CACHE_TIMEOUT = int(os.environ.get('USER_CACHE_TIMEOUT', 60))
+    USER_CACHE_MARKER = os.environ.get('USER_CACHE_MARKER', '/data/cache/users')
+
+    # Ограничение попыток входа: запас попыток и пополнение в минуту для IP и имени пользователя
+    LOGIN_THROTTLE_ENABLED = os.environ.get('LOGIN_THROTTLE_ENABLED', '1') == '1'
+    LOGIN_IP_BURST = int(os.environ.get('LOGIN_IP_BURST', 20))
+    LOGIN_IP_PER_MINUTE = float(os.environ.get('LOGIN_IP_PER_MINUTE', 10))
+    LOGIN_USERNAME_BURST = int(os.environ.get('LOGIN_USERNAME_BURST', 5))
+    LOGIN_USERNAME_PER_MINUTE = float(os.environ.get('LOGIN_USERNAME_PER_MINUTE', 2))
+    # Потоки для проверки хэшей паролей и длина очереди к ним
+    LOGIN_HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS', 2))
+    LOGIN_HASH_QUEUE = int(os.environ.get('LOGIN_HASH_QUEUE', 16))
+    # Параметры хэширования; старые хэши пересчитываются при следующем входе
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+    # Байткод шаблонов Jinja на постоянном диске (переживает деплой и перезапуск воркеров)
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR', '/data/cache/templates')
+    TEMPLATE_FRAGMENT_CACHE_ENABLED = os.environ.get('TEMPLATE_FRAGMENT_CACHE_ENABLED', '1') == '1'
+
+    # Собранная статика (копии с хэшем в имени, сжатые варианты) и сжатие ответов
+    ASSETS_DIR = os.environ.get('ASSETS_DIR', '/data/cache/assets')
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
@@ -11,7 +11,7 @@ def create_admin_user():
                 email='admin@example.com',
                 is_admin=True
             )
-            admin.set_password('2563214')  # Установите надежный пароль!
+            admin.set_password('2563214', method=app.config['PASSWORD_HASH_METHOD'])  # Установите надежный пароль!
             db.session.add(admin)
             db.session.commit()
             print('Администратор создан!')
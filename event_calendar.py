@@ -0,0 +1,175 @@
+import calendar
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime
+from urllib.parse import urlsplit
+
+from flask import current_app
+
+from feeds import canonical_url_builder, remove_stale, site_url, write_file
+from models import db, Event
+
+# Событие в индексе месяца: только то, что нужно для сетки календаря
+CalendarEvent = namedtuple('CalendarEvent', ['id', 'title', 'event_date', 'location'])
+
+# Сколько месяцев держать в памяти процесса
+MAX_MONTHS = 36
+FEED_BATCH_SIZE = 500
+
+
+def _month_bounds(year, month):
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def shift_month(year, month, delta):
+    index = year * 12 + month - 1 + delta
+    return index // 12, index % 12 + 1
+
+
+class EventCalendar:
+    """Календарь мероприятий по месяцам и лента iCalendar.
+
+    Индексы месяцев (день -> мероприятия) и файл .ics строятся один раз на версию
+    тега 'events' кэша страниц. Версия меняется при каждом добавлении, изменении
+    и удалении мероприятия, поэтому между записями база не читается.
+    """
+
+    def __init__(self, page_cache, app=None):
+        self.page_cache = page_cache
+        self._months = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('EVENTS_FEED_DIR', os.path.join(app.config['PAGE_CACHE_DIR'], 'feeds'))
+        app.config.setdefault('EVENTS_FEED_NAME', 'Мероприятия')
+        os.makedirs(app.config['EVENTS_FEED_DIR'], exist_ok=True)
+        app.extensions['event_calendar'] = self
+
+    def version(self):
+        return self.page_cache.tag_versions('events')[0]
+
+    # --- Календарь по месяцам ---
+
+    def month_index(self, year, month):
+        """Словарь {дата: [CalendarEvent, ...]} для месяца"""
+        key = (self.version(), year, month)
+        with self._lock:
+            index = self._months.get(key)
+            if index is not None:
+                self._months.move_to_end(key)
+                return index
+
+        start, end = _month_bounds(year, month)
+        rows = db.session.query(Event.id, Event.title, Event.event_date, Event.location) \
+            .filter(Event.event_date >= start, Event.event_date < end) \
+            .order_by(Event.event_date, Event.id).all()
+        index = {}
+        for row in rows:
+            index.setdefault(row.event_date.date(), []).append(CalendarEvent(*row))
+
+        with self._lock:
+            # Индексы старых версий больше не понадобятся
+            for stale in [stale for stale in self._months if stale[0] != key[0]]:
+                del self._months[stale]
+            self._months[key] = index
+            while len(self._months) > MAX_MONTHS:
+                self._months.popitem(last=False)
+        return index
+
+    def month_weeks(self, year, month):
+        """Недели месяца для сетки: [[(дата, [мероприятия]), ...], ...], неделя с понедельника"""
+        index = self.month_index(year, month)
+        return [
+            [(day, index.get(day, [])) for day in week]
+            for week in calendar.Calendar(firstweekday=0).monthdatescalendar(year, month)
+        ]
+
+    # --- Лента iCalendar ---
+
+    def _feed_path(self, version):
+        return os.path.join(current_app.config['EVENTS_FEED_DIR'], f'events-{version}.ics')
+
+    def feed_path(self):
+        """Путь к файлу ленты текущей версии; строит его, если файла еще нет"""
+        version = self.version()
+        path = self._feed_path(version)
+        if not os.path.exists(path):
+            write_file(path, (_fold(line) + '\r\n' for line in self._feed_lines()))
+            remove_stale(self._feed_path('*'), {path})
+        return path
+
+    def _feed_lines(self):
+        # Файл один на всех клиентов: домен для UID и ссылки берем из настроек, а не из запроса
+        url = canonical_url_builder()
+        host = urlsplit(site_url()).hostname
+        yield 'BEGIN:VCALENDAR'
+        yield 'VERSION:2.0'
+        yield f'PRODID:-//{host}//events//RU'
+        yield 'CALSCALE:GREGORIAN'
+        yield f'X-WR-CALNAME:{_escape(current_app.config["EVENTS_FEED_NAME"])}'
+
+        columns = [Event.id, Event.title, Event.description, Event.event_date, Event.location, Event.created_at]
+        last_id = 0
+        while True:
+            rows = db.session.query(*columns).filter(Event.id > last_id).order_by(Event.id) \
+                .limit(FEED_BATCH_SIZE).all()
+            if not rows:
+                break
+            for row in rows:
+                yield 'BEGIN:VEVENT'
+                yield f'UID:event-{row.id}@{host}'
+                yield f'DTSTAMP:{(row.created_at or datetime.utcnow()).strftime("%Y%m%dT%H%M%SZ")}'
+                # Время мероприятий хранится местным, поэтому передаем его без часового пояса
+                yield f'DTSTART:{row.event_date.strftime("%Y%m%dT%H%M%S")}'
+                yield f'SUMMARY:{_escape(row.title)}'
+                yield f'DESCRIPTION:{_escape(row.description)}'
+                if row.location:
+                    yield f'LOCATION:{_escape(row.location)}'
+                yield f'URL:{url("event_detail", event_id=row.id)}'
+                yield 'END:VEVENT'
+            last_id = rows[-1].id
+
+        yield 'END:VCALENDAR'
+
+
+def _escape(value):
+    """Экранирование текста по RFC 5545"""
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,') \
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def _fold(line):
+    """Переносит строки длиннее 75 байт (продолжение начинается с пробела)"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    current = ''
+    limit = 75
+    for char in line:
+        if len((current + char).encode('utf-8')) > limit:
+            parts.append(current)
+            current = ''
+            limit = 74  # у строк продолжения первый байт занимает пробел
+        current += char
+    parts.append(current)
+    return '\r\n '.join(parts)
+
+
+def parse_month(value):
+    """'2026-10' -> (2026, 10); по умолчанию текущий месяц"""
+    today = date.today()
+    if not value:
+        return today.year, today.month
+    try:
+        year, month = (int(part) for part in value.split('-', 1))
+    except ValueError:
+        return today.year, today.month
+    if not (1 <= month <= 12 and 1900 <= year <= 9999):
+        return today.year, today.month
+    return year, month
@@ -0,0 +1,248 @@
+import glob
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from urllib.parse import urlsplit
+from xml.sax.saxutils import escape
+
+from flask import current_app, request
+
+from models import db, News, Event
+
+FEED_FORMATS = ('atom', 'rss')
+# Страницы без записей в базе; попадают в отдельную секцию карты сайта
+SITEMAP_PAGES = ('index', 'news', 'events', 'events_calendar', 'about', 'contact')
+SITEMAP_MODELS = {
+    'news': (News, 'news_detail', 'news_id'),
+    'events': (Event, 'event_detail', 'event_id'),
+}
+
+
+def write_file(path, chunks):
+    """Пишет куски текста во временный файл и атомарно переименовывает его в path.
+
+    Параллельные процессы либо видят готовый файл, либо собирают свой.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.feed-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def remove_stale(pattern, keep):
+    """Удаляет собранные ранее файлы, не входящие в keep"""
+    for path in glob.glob(pattern):
+        if path not in keep:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def site_url():
+    """Канонический адрес сайта: SITE_URL, иначе SERVER_NAME с PREFERRED_URL_SCHEME.
+
+    Без настройки берется адрес текущего запроса - только для разработки:
+    заголовки Host и X-Forwarded-Host задает клиент.
+    """
+    config = current_app.config
+    if config['SITE_URL']:
+        return config['SITE_URL']
+    if config['SERVER_NAME']:
+        return f"{config['PREFERRED_URL_SCHEME']}://{config['SERVER_NAME']}{config['APPLICATION_ROOT']}"
+    return request.url_root
+
+
+def canonical_url_builder():
+    """Функция (endpoint, **values) -> абсолютный адрес от канонического адреса сайта.
+
+    Для файлов, которые собираются один раз и отдаются всем клиентам: адрес из
+    запроса, вызвавшего сборку, попал бы в ответы всем остальным.
+    """
+    base = urlsplit(site_url())
+    adapter = current_app.url_map.bind(base.netloc, script_name=base.path or '/', url_scheme=base.scheme)
+    return lambda endpoint, **values: adapter.build(endpoint, values, force_external=True)
+
+
+def _utc(value):
+    # created_at хранится в UTC без часового пояса (datetime.utcnow)
+    return (value or datetime.utcnow()).replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def _html(text):
+    return (text or '').replace('\n', '<br>')
+
+
+class Feeds:
+    """Ленты новостей (Atom, RSS) и карта сайта из заранее собранных файлов.
+
+    Файлы лежат в FEEDS_DIR, а в их имени записана версия тегов кэша страниц,
+    поэтому после записи в базу собираются заново при первом запросе, а до
+    этого отдаются с диска. Карта сайта разбита на секции по диапазонам id:
+    после изменения пересобираются только секции, у которых поменялась подпись
+    (число записей, последний id и created_at).
+    """
+
+    def __init__(self, page_cache, app=None):
+        self.page_cache = page_cache
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FEEDS_DIR', os.path.join(app.config['PAGE_CACHE_DIR'], 'feeds'))
+        app.config.setdefault('SITE_URL', None)
+        app.config.setdefault('FEED_TITLE', 'Новости')
+        app.config.setdefault('FEED_SIZE', 30)
+        # Протокол допускает до 50000 адресов в одном файле; небольшие секции дешевле пересобирать
+        app.config.setdefault('SITEMAP_SHARD_SIZE', 5000)
+        os.makedirs(app.config['FEEDS_DIR'], exist_ok=True)
+        app.extensions['feeds'] = self
+
+    def _path(self, name):
+        return os.path.join(current_app.config['FEEDS_DIR'], name)
+
+    # --- Ленты новостей ---
+
+    def news_feed_path(self, fmt):
+        version = self.page_cache.tag_versions('news')[0]
+        path = self._path(f'news-{version}.{fmt}.xml')
+        if not os.path.exists(path):
+            items = db.session.query(News.id, News.title, News.content, News.created_at) \
+                .order_by(News.created_at.desc(), News.id.desc()) \
+                .limit(current_app.config['FEED_SIZE']).all()
+            write_file(path, self._atom(items) if fmt == 'atom' else self._rss(items))
+            remove_stale(self._path(f'news-*.{fmt}.xml'), {path})
+        return path
+
+    def _atom(self, items):
+        url = canonical_url_builder()
+        title = escape(current_app.config['FEED_TITLE'])
+        updated = max((_utc(item.created_at) for item in items), default=_utc(None))
+        yield '<?xml version="1.0" encoding="utf-8"?>\n'
+        yield '<feed xmlns="http://www.w3.org/2005/Atom">\n'
+        yield f'<title>{title}</title>\n'
+        yield f'<id>{escape(url("news"))}</id>\n'
+        yield f'<link href="{escape(url("news"))}"/>\n'
+        yield f'<link rel="self" href="{escape(url("news_feed", fmt="atom"))}"/>\n'
+        yield f'<updated>{updated.isoformat()}</updated>\n'
+        for item in items:
+            link = escape(url('news_detail', news_id=item.id))
+            yield '<entry>\n'
+            yield f'<title>{escape(item.title)}</title>\n'
+            yield f'<id>{link}</id>\n'
+            yield f'<link href="{link}"/>\n'
+            yield f'<updated>{_utc(item.created_at).isoformat()}</updated>\n'
+            yield f'<author><name>{title}</name></author>\n'
+            yield f'<content type="html">{escape(_html(item.content))}</content>\n'
+            yield '</entry>\n'
+        yield '</feed>\n'
+
+    def _rss(self, items):
+        url = canonical_url_builder()
+        yield '<?xml version="1.0" encoding="utf-8"?>\n'
+        yield '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">\n<channel>\n'
+        yield f'<title>{escape(current_app.config["FEED_TITLE"])}</title>\n'
+        yield f'<link>{escape(url("news"))}</link>\n'
+        yield f'<description>{escape(current_app.config["FEED_TITLE"])}</description>\n'
+        yield '<language>ru</language>\n'
+        yield f'<atom:link rel="self" type="application/rss+xml" ' \
+              f'href="{escape(url("news_feed", fmt="rss"))}"/>\n'
+        for item in items:
+            link = escape(url('news_detail', news_id=item.id))
+            yield '<item>\n'
+            yield f'<title>{escape(item.title)}</title>\n'
+            yield f'<link>{link}</link>\n'
+            yield f'<guid isPermaLink="true">{link}</guid>\n'
+            yield f'<pubDate>{format_datetime(_utc(item.created_at))}</pubDate>\n'
+            yield f'<description>{escape(_html(item.content))}</description>\n'
+            yield '</item>\n'
+        yield '</channel>\n</rss>\n'
+
+    # --- Карта сайта ---
+
+    def _manifest_path(self):
+        versions = self.page_cache.tag_versions('news', 'events')
+        return self._path('sitemap-{}-{}.json'.format(*versions))
+
+    def _manifest(self):
+        """Секции карты сайта: {'news': {'0': {'signature': ..., 'lastmod': ...}}, ...}"""
+        path = self._manifest_path()
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+
+        size = current_app.config['SITEMAP_SHARD_SIZE']
+        manifest = {'pages': {'0': {'signature': 'static', 'lastmod': None}}}
+        for kind, (model, _, _) in SITEMAP_MODELS.items():
+            # Одна агрегирующая выборка по всем секциям вместо обхода таблицы
+            shard = ((model.id - 1) // size).label('shard')
+            rows = db.session.query(shard, db.func.count(model.id), db.func.max(model.id),
+                                    db.func.max(model.created_at)) \
+                .group_by(shard).order_by(shard).all()
+            manifest[kind] = {}
+            for number, count, max_id, lastmod in rows:
+                lastmod = _utc(lastmod).isoformat() if lastmod else None
+                manifest[kind][str(number)] = {
+                    'signature': f'{count}-{max_id}-{lastmod or ""}'.replace(':', ''),
+                    'lastmod': lastmod,
+                }
+
+        write_file(path, [json.dumps(manifest)])
+        remove_stale(self._path('sitemap-*.json'), {path})
+        remove_stale(self._path('sitemap-*.xml'), {self._shard_file(kind, number, shard['signature'])
+                                                   for kind, shards in manifest.items()
+                                                   for number, shard in shards.items()})
+        return manifest
+
+    def _shard_file(self, kind, number, signature):
+        return self._path(f'sitemap-{kind}-{number}-{signature}.xml')
+
+    def sitemap_index(self):
+        """Текст индекса карты сайта: небольшой, собирается из манифеста"""
+        url = canonical_url_builder()
+        lines = ['<?xml version="1.0" encoding="utf-8"?>',
+                 '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for kind, shards in self._manifest().items():
+            for number, shard in shards.items():
+                loc = escape(url('sitemap_shard', kind=kind, number=int(number)))
+                lastmod = f'<lastmod>{shard["lastmod"]}</lastmod>' if shard['lastmod'] else ''
+                lines.append(f'<sitemap><loc>{loc}</loc>{lastmod}</sitemap>')
+        lines.append('</sitemapindex>')
+        return '\n'.join(lines) + '\n'
+
+    def sitemap_shard_path(self, kind, number):
+        """Путь к файлу секции карты сайта или None, если такой секции нет"""
+        shard = self._manifest().get(kind, {}).get(str(number))
+        if shard is None:
+            return None
+        path = self._shard_file(kind, number, shard['signature'])
+        if not os.path.exists(path):
+            write_file(path, self._urlset(kind, number))
+        return path
+
+    def _urlset(self, kind, number):
+        url = canonical_url_builder()
+        yield '<?xml version="1.0" encoding="utf-8"?>\n'
+        yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        if kind == 'pages':
+            for endpoint in SITEMAP_PAGES:
+                yield f'<url><loc>{escape(url(endpoint))}</loc></url>\n'
+        else:
+            model, endpoint, id_arg = SITEMAP_MODELS[kind]
+            size = current_app.config['SITEMAP_SHARD_SIZE']
+            rows = db.session.query(model.id, model.created_at) \
+                .filter(model.id > number * size, model.id <= (number + 1) * size).order_by(model.id)
+            for row in rows:
+                loc = escape(url(endpoint, **{id_arg: row.id}))
+                lastmod = f'<lastmod>{_utc(row.created_at).isoformat()}</lastmod>' if row.created_at else ''
+                yield f'<url><loc>{loc}</loc>{lastmod}</url>\n'
+        yield '</urlset>\n'
@@ -0,0 +1,94 @@
+"""Конфигурация gunicorn для продакшена.
+
+    gunicorn --config gunicorn.conf.py app:app
+
+Код приложения загружается один раз в мастер-процессе (preload_app), схема базы
+создается там же до запуска воркеров. Перечитать конфигурацию и плавно заменить
+воркеров - сигнал HUP мастеру; для выката нового кода - USR2 (новый мастер),
+затем QUIT старому.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Память на одного воркера с учетом Pillow и кэша страниц, МБ
+WORKER_MEMORY_MB = int(os.environ.get('WORKER_MEMORY_MB', 200))
+
+
+def _memory_limit_mb():
+    """Лимит памяти контейнера (cgroup v2/v1) или доступная память хоста"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # Отсутствие лимита: 'max' в v2 и огромное число в v1
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value) // (1024 * 1024)
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def _default_workers():
+    by_cpu = multiprocessing.cpu_count() * 2 + 1
+    memory_mb = _memory_limit_mb()
+    if memory_mb is None:
+        return by_cpu
+    return max(1, min(by_cpu, memory_mb // WORKER_MEMORY_MB))
+
+
+workers = int(os.environ.get('WEB_CONCURRENCY') or _default_workers())
+# Несколько потоков на воркера, чтобы медленные загрузки файлов не занимали весь процесс
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Периодический перезапуск воркеров ограничивает рост памяти
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """Создает схему, собирает статику и компилирует шаблоны один раз в мастер-процессе"""
+    from app import app, init_database, build_assets, precompile_templates
+    import metrics
+    init_database()
+    if app.config['METRICS_DIR']:
+        metrics.reset(app.config['METRICS_DIR'])
+    build_assets()
+    # При preload_app воркеры получают скомпилированные шаблоны вместе с памятью мастера
+    precompile_templates()
+
+
+def post_fork(server, worker):
+    """Воркер не должен использовать соединения, открытые мастером до fork и чужие метрики с тем же pid"""
+    from app import app, db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    if app.config['METRICS_ENABLED'] and app.config['METRICS_DIR']:
+        import metrics
+        metrics.archive_worker(app.config['METRICS_DIR'], os.getpid())
+
+
+def worker_exit(server, worker):
+    """Сохраняет последние метрики воркера перед выходом"""
+    from app import app, request_metrics
+    if app.config['METRICS_ENABLED']:
+        with app.app_context():
+            request_metrics.flush()
+
@@ -0,0 +1,124 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import url_for
+from markupsafe import Markup, escape
+from PIL import Image, ImageOps
+
+# Ширина вариантов изображений в пикселях
+VARIANT_WIDTHS = {
+    'thumb': 400,     # карточки в списках
+    'gallery': 1024,  # галерея и страницы мероприятий
+    'full': 1920,     # полноэкранный просмотр
+}
+VARIANTS_DIR = 'variants'
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+# Генерация вариантов выполняется в фоне, чтобы не задерживать ответ на загрузку
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-variants')
+
+
+def variant_filename(filename, width, extension):
+    """Имя файла варианта внутри папки variants: photo.jpg -> photo.jpg.400.webp"""
+    return f'{VARIANTS_DIR}/{filename}.{width}.{extension}'
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+
+
+def _flatten(image, background=(255, 255, 255)):
+    """Кладет изображение с прозрачностью на белый фон (в JPEG альфа-канала нет)"""
+    if image.mode != 'RGBA':
+        return image
+    flat = Image.new('RGB', image.size, background)
+    flat.paste(image, mask=image.getchannel('A'))
+    return flat
+
+
+def generate_variants(upload_folder, filename):
+    """Создает JPEG- и WebP-варианты изображения, возвращает список созданных ширин"""
+    source_path = os.path.join(upload_folder, filename)
+    os.makedirs(os.path.join(upload_folder, VARIANTS_DIR), exist_ok=True)
+
+    created = []
+    with Image.open(source_path) as original:
+        # Прозрачность сохраняем для WebP; без convert('RGBA') прозрачные области стали бы черными
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+
+    for name, width in sorted(VARIANT_WIDTHS.items(), key=lambda item: item[1]):
+        # Не увеличиваем картинку: вариант создаем, пока оригинал шире предыдущего.
+        # Последний вариант получается шириной с оригинал (thumbnail не увеличивает),
+        # иначе для галереи и полноэкранного просмотра остался бы только самый маленький
+        if created and image.width <= created[-1]:
+            break
+
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+
+        jpeg_path = os.path.join(upload_folder, variant_filename(filename, width, 'jpg'))
+        webp_path = os.path.join(upload_folder, variant_filename(filename, width, 'webp'))
+        _flatten(resized).save(jpeg_path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        # WebP пишем последним: его наличие означает, что вариант готов полностью
+        resized.save(webp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+        created.append(width)
+
+    return created
+
+
+def _generate_safely(upload_folder, filename):
+    try:
+        generate_variants(upload_folder, filename)
+    except Exception as e:
+        print(f"Ошибка создания вариантов изображения {filename}: {str(e)}")
+
+
+def schedule_variants(upload_folder, filename):
+    """Ставит генерацию вариантов в очередь фонового пула"""
+    return _executor.submit(_generate_safely, upload_folder, filename)
+
+
+def available_widths(upload_folder, filename, variants):
+    return [
+        VARIANT_WIDTHS[name] for name in variants
+        if os.path.exists(os.path.join(upload_folder, variant_filename(filename, VARIANT_WIDTHS[name], 'webp')))
+    ]
+
+
+def _attributes(attrs):
+    return ''.join(
+        f' {name.rstrip("_").replace("_", "-")}="{escape(value)}"'
+        for name, value in attrs.items() if value is not None
+    )
+
+
+def responsive_image(upload_folder, image_path, alt='', variants=('thumb', 'gallery'),
+                     sizes='100vw', **attrs):
+    """HTML-разметка <picture> с srcset по готовым вариантам и ленивой загрузкой.
+
+    Пока варианты не созданы, выводится обычный <img> с оригиналом.
+    """
+    filename = image_path.split('/')[-1]
+    widths = available_widths(upload_folder, filename, variants)
+    img_attrs = dict(alt=alt, loading='lazy', decoding='async', **attrs)
+
+    if not widths:
+        src = url_for('uploaded_files', filename=filename)
+        return Markup(f'<img src="{escape(src)}"{_attributes(img_attrs)}>')
+
+    def srcset(extension):
+        return ', '.join(
+            f"{url_for('uploaded_files', filename=variant_filename(filename, width, extension))} {width}w"
+            for width in widths
+        )
+
+    fallback = url_for('uploaded_files', filename=variant_filename(filename, widths[-1], 'jpg'))
+    return Markup(
+        '<picture>'
+        f'<source type="image/webp" srcset="{escape(srcset("webp"))}" sizes="{escape(sizes)}">'
+        f'<img src="{escape(fallback)}" srcset="{escape(srcset("jpg"))}" sizes="{escape(sizes)}"'
+        f'{_attributes(img_attrs)}>'
+        '</picture>'
+    )
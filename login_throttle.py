@@ -0,0 +1,166 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash
+
+
+def hash_method_prefix(method):
+    """Параметры хэша так, как их записывает generate_password_hash: 'pbkdf2' -> 'pbkdf2:sha256:<итерации>'"""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        args = ['32768', '8', '1']
+    elif name == 'pbkdf2':
+        args = (args + ['sha256'])[:1] + (args[1:] or [str(DEFAULT_PBKDF2_ITERATIONS)])
+    return ':'.join([name] + args)
+
+
+class LoginThrottled(Exception):
+    def __init__(self, message, retry_after, status_code=429):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class TokenBucket:
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, capacity, per_minute):
+        self.capacity = capacity
+        self.rate = per_minute / 60
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Сколько секунд ждать до следующего токена (0 - токен есть)"""
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate if self.rate else 60
+
+
+class LoginThrottle:
+    """Ограничение попыток входа и проверка паролей в отдельном пуле потоков.
+
+    Каждая попытка расходует токен из корзины IP-адреса и корзины имени
+    пользователя; пустая корзина означает отказ до вычисления хэша. Сами
+    проверки хэша идут в пуле из LOGIN_HASH_WORKERS потоков с очередью не
+    длиннее LOGIN_HASH_QUEUE, так что поток перебора паролей занимает не больше
+    этих ядер. Корзины живут в памяти процесса: при нескольких воркерах
+    gunicorn фактический лимит умножается на их число.
+    """
+
+    def __init__(self, app=None):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._slots = None
+        self._dummy_hash = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LOGIN_THROTTLE_ENABLED', True)
+        app.config.setdefault('LOGIN_IP_BURST', 20)
+        app.config.setdefault('LOGIN_IP_PER_MINUTE', 10)
+        app.config.setdefault('LOGIN_USERNAME_BURST', 5)
+        app.config.setdefault('LOGIN_USERNAME_PER_MINUTE', 2)
+        app.config.setdefault('LOGIN_THROTTLE_MAX_KEYS', 10000)
+        app.config.setdefault('LOGIN_HASH_WORKERS', 2)
+        app.config.setdefault('LOGIN_HASH_QUEUE', 16)
+        app.config.setdefault('LOGIN_HASH_TIMEOUT', 10)
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+        # Заглушка для несуществующих пользователей: строка в формате хэша со случайными солью
+        # и значением. Собирается без вычисления хэша, а проверка против нее стоит столько же,
+        # сколько настоящая, и никогда не проходит
+        self._dummy_hash = '{}${}${}'.format(hash_method_prefix(app.config['PASSWORD_HASH_METHOD']),
+                                             secrets.token_hex(8), secrets.token_hex(32))
+        app.extensions['login_throttle'] = self
+
+    # --- Корзины токенов ---
+
+    def _bucket(self, key, capacity, per_minute, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(capacity, per_minute)
+            # Перебор случайных имен не должен раздувать память
+            while len(self._buckets) > current_app.config['LOGIN_THROTTLE_MAX_KEYS']:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.refill(now)
+        return bucket
+
+    def acquire(self, ip, username):
+        """Расходует по токену из обеих корзин; при пустой корзине бросает LoginThrottled"""
+        config = current_app.config
+        if not config['LOGIN_THROTTLE_ENABLED']:
+            return
+        now = time.monotonic()
+        with self._lock:
+            buckets = [
+                self._bucket(('ip', ip), config['LOGIN_IP_BURST'], config['LOGIN_IP_PER_MINUTE'], now),
+                self._bucket(('user', username.lower()), config['LOGIN_USERNAME_BURST'],
+                             config['LOGIN_USERNAME_PER_MINUTE'], now),
+            ]
+            wait = max(bucket.wait_time() for bucket in buckets)
+            if wait:
+                raise LoginThrottled('Слишком много попыток входа. Попробуйте позже', int(wait) + 1)
+            for bucket in buckets:
+                bucket.tokens -= 1
+
+    def reset(self, username):
+        """После успешного входа попытки по имени пользователя начинаются заново"""
+        with self._lock:
+            self._buckets.pop(('user', username.lower()), None)
+
+    # --- Проверка хэшей ---
+
+    def _pool(self):
+        # Потоки не переживают fork, поэтому пул создается в каждом воркере заново
+        config = current_app.config
+        with self._lock:
+            if self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=config['LOGIN_HASH_WORKERS'],
+                                                    thread_name_prefix='password-hash')
+                self._slots = threading.BoundedSemaphore(config['LOGIN_HASH_WORKERS'] + config['LOGIN_HASH_QUEUE'])
+                self._executor_pid = os.getpid()
+            return self._executor, self._slots
+
+    def check_password(self, password_hash, password):
+        """check_password_hash в пуле потоков.
+
+        Для несуществующего пользователя (password_hash=None) проверяется
+        заглушка со случайным паролем, чтобы время ответа не выдавало, есть ли такое имя.
+        """
+        if password_hash is None:
+            password_hash = self._dummy_hash
+
+        executor, slots = self._pool()
+        if not slots.acquire(blocking=False):
+            raise LoginThrottled('Сервер перегружен попытками входа. Попробуйте позже', 5, status_code=503)
+        try:
+            future = executor.submit(check_password_hash, password_hash, password)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=current_app.config['LOGIN_HASH_TIMEOUT'])
+        except TimeoutError:
+            raise LoginThrottled('Сервер перегружен попытками входа. Попробуйте позже', 5, status_code=503)
+
+    @staticmethod
+    def needs_rehash(password_hash):
+        """Хэш посчитан не с текущими параметрами PASSWORD_HASH_METHOD"""
+        prefix = hash_method_prefix(current_app.config['PASSWORD_HASH_METHOD'])
+        return (password_hash or '').split('$', 1)[0] != prefix
@@ -0,0 +1,49 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import abort, current_app, request, send_from_directory
+from werkzeug.security import safe_join
+
+
+def _accel_redirect(directory, filename, max_age):
+    """Ответ с X-Accel-Redirect: байты файла отдает nginx, а не воркер Python"""
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    stat = os.stat(path)
+    internal_path = os.path.relpath(path, current_app.config['UPLOAD_FOLDER'])
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response = current_app.response_class(mimetype=mimetype)
+    response.headers['X-Accel-Redirect'] = f"{current_app.config['MEDIA_ACCEL_PREFIX']}/{quote(internal_path)}"
+    response.last_modified = int(stat.st_mtime)
+    # Тот же ETag, что nginx выставит файлу из internal-location: "<mtime в секундах>-<размер>" в hex.
+    # Клиенты запоминают ETag nginx, и только при совпадении If-None-Match сработает здесь
+    response.set_etag(f'{int(stat.st_mtime):x}-{stat.st_size:x}')
+    if max_age is None:
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+
+    # 304 отвечаем сами; Range и 206 для тела обрабатывает прокси
+    response.make_conditional(request)
+    if response.status_code == 304:
+        del response.headers['X-Accel-Redirect']
+    return response
+
+
+def send_media(directory, filename, max_age=None):
+    """Отдает загруженный файл с поддержкой Range, ETag и Last-Modified.
+
+    Режим MEDIA_OFFLOAD='x-accel' передает отдачу nginx через X-Accel-Redirect,
+    'x-sendfile' - через заголовок X-Sendfile (Apache, lighttpd, Caddy).
+    """
+    if current_app.config.get('MEDIA_OFFLOAD') == 'x-accel':
+        return _accel_redirect(directory, filename, max_age)
+
+    # send_from_directory сам обрабатывает Range/206 и условные запросы,
+    # а при USE_X_SENDFILE вместо тела выставляет X-Sendfile
+    return send_from_directory(directory, filename, max_age=max_age)
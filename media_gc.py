@@ -0,0 +1,160 @@
+import os
+import shutil
+import time
+from collections import namedtuple
+from itertools import islice
+
+from models import db, NewsImage, NewsVideo, Event
+from chunked_uploads import PARTIAL_DIR
+from images import VARIANTS_DIR
+
+# Файлы моложе этого возраста не удаляются: запись о них может быть еще не сохранена
+DEFAULT_GRACE_SECONDS = 24 * 60 * 60
+# Незавершенные загрузки видео живут дольше - их могут докачивать после обрыва связи
+PARTIAL_GRACE_SECONDS = 7 * 24 * 60 * 60
+BATCH_SIZE = 500
+
+CATEGORIES = {
+    'images': 'Изображения',
+    'variants': 'Варианты изображений',
+    'videos': 'Видео',
+    'partial': 'Незавершенные загрузки',
+    'temp': 'Временные файлы',
+}
+
+MediaFile = namedtuple('MediaFile', ['category', 'path', 'name', 'size', 'mtime'])
+
+
+def _files(folder):
+    try:
+        entries = os.scandir(folder)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                yield entry, stat.st_size, stat.st_mtime
+
+
+def _partial_files(folder):
+    """Незавершенные загрузки: данные и описание (<id> и <id>.json) живут и удаляются вместе"""
+    uploads = {}
+    for entry, size, mtime in _files(folder):
+        uploads.setdefault(entry.name.split('.')[0], []).append((entry, size, mtime))
+    for upload_id, files in uploads.items():
+        # Возраст загрузки - по последнему дописанному куску
+        last_activity = max(mtime for _, _, mtime in files)
+        for entry, size, _ in files:
+            yield MediaFile('partial', entry.path, upload_id, size, last_activity)
+
+
+def scan(upload_folder):
+    """Обходит хранилище и возвращает все файлы с категорией и именем, по которому на них ссылается база"""
+    video_folder = os.path.join(upload_folder, 'videos')
+    folders = [
+        (upload_folder, 'images'),
+        (os.path.join(upload_folder, VARIANTS_DIR), 'variants'),
+        (video_folder, 'videos'),
+    ]
+    for folder, category in folders:
+        for entry, size, mtime in _files(folder):
+            name = entry.name
+            if name.startswith('.upload-'):
+                # Остаток прерванного сохранения (storage.save_stream)
+                yield MediaFile('temp', entry.path, name, size, mtime)
+            elif category == 'variants':
+                # photo.jpg.400.webp -> photo.jpg
+                yield MediaFile(category, entry.path, name.rsplit('.', 2)[0], size, mtime)
+            else:
+                yield MediaFile(category, entry.path, name, size, mtime)
+    yield from _partial_files(os.path.join(video_folder, PARTIAL_DIR))
+
+
+def _referenced(column, prefix, names):
+    """Какие из имен файлов сейчас упоминаются в колонке (проверка пакетом)"""
+    paths = [f'{prefix}{name}' for name in names]
+    rows = db.session.query(column).filter(column.in_(paths)).distinct()
+    return {path[len(prefix):] for (path,) in rows}
+
+
+def _referenced_images(names):
+    return _referenced(NewsImage.image_path, 'uploads/', names) | _referenced(Event.image_path, 'uploads/', names)
+
+
+def _referenced_videos(names):
+    return _referenced(NewsVideo.video_path, 'uploads/videos/', names)
+
+
+def _orphans(candidates):
+    """Оставляет из пакета кандидатов только файлы, на которые нет ссылок в базе"""
+    by_category = {}
+    for media_file in candidates:
+        by_category.setdefault(media_file.category, []).append(media_file)
+
+    orphans = by_category.get('temp', []) + by_category.get('partial', [])
+    for category, lookup in (('images', _referenced_images), ('variants', _referenced_images),
+                             ('videos', _referenced_videos)):
+        files = by_category.get(category)
+        if files:
+            used = lookup({media_file.name for media_file in files})
+            orphans += [media_file for media_file in files if media_file.name not in used]
+    return orphans
+
+
+def _eligible(media_file, now, grace):
+    age = now - media_file.mtime
+    return age >= (PARTIAL_GRACE_SECONDS if media_file.category == 'partial' else grace)
+
+
+def collect(upload_folder, grace=DEFAULT_GRACE_SECONDS, dry_run=True):
+    """Находит (и без dry_run удаляет) файлы без ссылок в базе, старше grace секунд.
+
+    Возвращает отчет: занятое место, освобождаемое место по категориям и число удаленных файлов.
+    """
+    now = time.time()
+    report = {
+        'categories': {category: {'files': 0, 'bytes': 0, 'orphan_files': 0, 'orphan_bytes': 0}
+                       for category in CATEGORIES},
+        'deleted_files': 0,
+        'deleted_bytes': 0,
+    }
+    files = scan(upload_folder)
+    while True:
+        # Обходим хранилище пакетами, чтобы память не зависела от числа файлов
+        batch = list(islice(files, BATCH_SIZE))
+        if not batch:
+            break
+
+        candidates = []
+        for media_file in batch:
+            stats = report['categories'][media_file.category]
+            stats['files'] += 1
+            stats['bytes'] += media_file.size
+            if _eligible(media_file, now, grace):
+                candidates.append(media_file)
+
+        for media_file in _orphans(candidates):
+            stats = report['categories'][media_file.category]
+            stats['orphan_files'] += 1
+            stats['orphan_bytes'] += media_file.size
+            if dry_run:
+                continue
+            try:
+                os.remove(media_file.path)
+            except FileNotFoundError:
+                continue
+            report['deleted_files'] += 1
+            report['deleted_bytes'] += media_file.size
+
+    report['used_bytes'] = sum(stats['bytes'] for stats in report['categories'].values())
+    report['reclaimable_bytes'] = sum(stats['orphan_bytes'] for stats in report['categories'].values())
+    report['disk'] = shutil.disk_usage(upload_folder)
+    return report
+
+
+def format_size(size):
+    for unit in ('Б', 'КБ', 'МБ', 'ГБ'):
+        if size < 1024 or unit == 'ГБ':
+            return f'{size:.0f} {unit}' if unit == 'Б' else f'{size:.1f} {unit}'
+        size /= 1024
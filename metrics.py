@@ -0,0 +1,316 @@
+import fcntl
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Границы корзин гистограмм в секундах
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Накопительная гистограмма в формате Prometheus"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+ARCHIVE_NAME = 'archive.json'
+
+
+@contextmanager
+def _folder_lock(folder):
+    # Сбор метрик и перенос итогов завершившихся воркеров в архив идут под одной
+    # блокировкой - иначе во время переноса счетчики могли бы на мгновение уменьшиться
+    with open(os.path.join(folder, '.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_state(path, state):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.metrics-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _empty_state():
+    return {'histograms': {}, 'sql_counts': {}, 'slow_queries': {}}
+
+
+def _merge(target, state):
+    for key, (counts, total, total_sum) in state['histograms'].items():
+        current = target['histograms'].setdefault(key, [[0] * len(BUCKETS), 0, 0.0])
+        current[0] = [a + b for a, b in zip(current[0], counts)]
+        current[1] += total
+        current[2] += total_sum
+    for name in ('sql_counts', 'slow_queries'):
+        for endpoint, count in state[name].items():
+            target[name][endpoint] = target[name].get(endpoint, 0) + count
+    return target
+
+
+def _archive(folder, pid):
+    worker_path = os.path.join(folder, f'worker-{pid}.json')
+    state = _read_state(worker_path)
+    if state is None:
+        return
+    archive_path = os.path.join(folder, ARCHIVE_NAME)
+    _write_state(archive_path, _merge(_read_state(archive_path) or _empty_state(), state))
+    os.remove(worker_path)
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def archive_worker(folder, pid):
+    """Переносит итоги процесса pid в общий архив.
+
+    Новый воркер вызывает это для своего pid: если pid достался от завершившегося
+    воркера, его счетчики не будут перезаписаны.
+    """
+    with _folder_lock(folder):
+        _archive(folder, pid)
+
+
+def reset(folder):
+    """Удаляет накопленные метрики (при запуске мастера: новые процессы - новые счетчики)"""
+    os.makedirs(folder, exist_ok=True)
+    for path in glob.glob(os.path.join(folder, '*.json')):
+        os.remove(path)
+
+
+class RequestMetrics:
+    """Замеры запросов: SQL (число и время), рендер шаблонов и общее время.
+
+    Итог каждого запроса уходит в заголовок Server-Timing и в гистограммы по маршрутам,
+    которые отдаются в формате Prometheus. Медленные SQL-запросы пишутся в лог
+    с именем маршрута. Каждый воркер не чаще раза в METRICS_FLUSH_INTERVAL секунд
+    сохраняет свои значения в METRICS_DIR, а render() складывает файлы всех
+    воркеров, поэтому сборщик видит общие счетчики, в какой бы воркер ни попал.
+    """
+
+    METRICS = (
+        ('request_duration_seconds', 'Общее время обработки запроса', 'total'),
+        ('sql_duration_seconds', 'Время SQL-запросов за запрос', 'sql_time'),
+        ('template_duration_seconds', 'Время рендера шаблонов за запрос (включая SQL из шаблонов)', 'template_time'),
+    )
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._sql_counts = {}
+        self._slow_queries = {}
+        self._last_flush = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('SLOW_QUERY_MS', 200)
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.config.setdefault('METRICS_DIR', None)
+        app.config.setdefault('METRICS_FLUSH_INTERVAL', 1.0)
+        app.extensions['metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+        if app.config['METRICS_DIR']:
+            os.makedirs(app.config['METRICS_DIR'], exist_ok=True)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        before_render_template.connect(self._start_template, app)
+        template_rendered.connect(self._finish_template, app)
+        # Слушаем все движки: у Flask-SQLAlchemy движок создается лениво
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            event.listen(Engine, 'handle_error', self._handle_error)
+
+    @staticmethod
+    def _stats():
+        if not has_request_context():
+            return None
+        return g.get('_request_metrics')
+
+    def _start_request(self):
+        g._request_metrics = {
+            'started': time.perf_counter(),
+            'sql_count': 0,
+            'sql_time': 0.0,
+            'template_time': 0.0,
+            'template_depth': 0,
+        }
+
+    def _start_template(self, sender, template, context, **extra):
+        stats = self._stats()
+        if stats is None:
+            return
+        if stats['template_depth'] == 0:
+            stats['template_started'] = time.perf_counter()
+        stats['template_depth'] += 1
+
+    def _finish_template(self, sender, template, context, **extra):
+        stats = self._stats()
+        if stats is None or not stats['template_depth']:
+            return
+        stats['template_depth'] -= 1
+        if stats['template_depth'] == 0:
+            stats['template_time'] += time.perf_counter() - stats['template_started']
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['metrics_query_started'].pop()
+        elapsed = time.perf_counter() - started
+        stats = self._stats()
+        if stats is None:
+            return
+
+        stats['sql_count'] += 1
+        stats['sql_time'] += elapsed
+        if elapsed * 1000 >= current_app.config['SLOW_QUERY_MS']:
+            endpoint = request.endpoint or 'unknown'
+            current_app.logger.warning(
+                "Медленный SQL-запрос (%.1f мс) в маршруте %s: %s",
+                elapsed * 1000, endpoint, ' '.join(statement.split())[:1000]
+            )
+            with self._lock:
+                self._slow_queries[endpoint] = self._slow_queries.get(endpoint, 0) + 1
+
+    @staticmethod
+    def _handle_error(exception_context):
+        # Упавший запрос не доходит до after_cursor_execute - убираем его отметку времени
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('metrics_query_started'):
+            connection.info['metrics_query_started'].pop()
+
+    def _finish_request(self, response):
+        stats = self._stats()
+        if stats is None:
+            return response
+        stats['total'] = time.perf_counter() - stats['started']
+
+        response.headers.add('Server-Timing', ', '.join([
+            f'sql;dur={stats["sql_time"] * 1000:.1f};desc="{stats["sql_count"]} queries"',
+            f'tpl;dur={stats["template_time"] * 1000:.1f}',
+            f'total;dur={stats["total"] * 1000:.1f}',
+        ]))
+
+        # Метка - имя маршрута, а не путь, чтобы число серий было ограниченным
+        endpoint = request.endpoint or 'unknown'
+        with self._lock:
+            for name, _, key in self.METRICS:
+                self._histograms.setdefault((name, endpoint), Histogram()).observe(stats[key])
+            self._sql_counts[endpoint] = self._sql_counts.get(endpoint, 0) + stats['sql_count']
+
+        now = time.monotonic()
+        if current_app.config['METRICS_DIR'] and now - self._last_flush >= current_app.config['METRICS_FLUSH_INTERVAL']:
+            self._last_flush = now
+            self.flush()
+        return response
+
+    def _snapshot(self):
+        with self._lock:
+            return {
+                'histograms': {f'{name}|{endpoint}': [list(histogram.counts), histogram.total, histogram.sum]
+                               for (name, endpoint), histogram in self._histograms.items()},
+                'sql_counts': dict(self._sql_counts),
+                'slow_queries': dict(self._slow_queries),
+            }
+
+    def flush(self):
+        """Сохраняет значения этого процесса в METRICS_DIR"""
+        folder = current_app.config['METRICS_DIR']
+        if folder:
+            _write_state(os.path.join(folder, f'worker-{os.getpid()}.json'), self._snapshot())
+
+    def _collect(self):
+        folder = current_app.config['METRICS_DIR']
+        if not folder:
+            return self._snapshot()
+        self.flush()
+        state = _empty_state()
+        with _folder_lock(folder):
+            # Итоги завершившихся воркеров складываем в архив, чтобы число файлов не росло
+            for path in glob.glob(os.path.join(folder, 'worker-*.json')):
+                pid = int(os.path.basename(path)[len('worker-'):-len('.json')])
+                if not _is_running(pid):
+                    _archive(folder, pid)
+            for path in glob.glob(os.path.join(folder, '*.json')):
+                worker_state = _read_state(path)
+                if worker_state is not None:
+                    _merge(state, worker_state)
+        return state
+
+    def render(self):
+        """Текст метрик в формате Prometheus (сумма по всем воркерам)"""
+        state = self._collect()
+        histograms = {}
+        for key, value in state['histograms'].items():
+            name, endpoint = key.split('|', 1)
+            histograms[(name, endpoint)] = value
+
+        lines = []
+        for name, description, _ in self.METRICS:
+            metric = f'chest_{name}'
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} histogram')
+            for (histogram_name, endpoint), (counts, total, total_sum) in sorted(histograms.items()):
+                if histogram_name != name:
+                    continue
+                for bound, count in zip(BUCKETS, counts):
+                    lines.append(f'{metric}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{endpoint="{endpoint}",le="+Inf"}} {total}')
+                lines.append(f'{metric}_sum{{endpoint="{endpoint}"}} {total_sum:.6f}')
+                lines.append(f'{metric}_count{{endpoint="{endpoint}"}} {total}')
+
+        lines.append('# HELP chest_sql_queries_total Число SQL-запросов')
+        lines.append('# TYPE chest_sql_queries_total counter')
+        for endpoint, count in sorted(state['sql_counts'].items()):
+            lines.append(f'chest_sql_queries_total{{endpoint="{endpoint}"}} {count}')
+
+        lines.append('# HELP chest_slow_queries_total Число медленных SQL-запросов')
+        lines.append('# TYPE chest_slow_queries_total counter')
+        for endpoint, count in sorted(state['slow_queries'].items()):
+            lines.append(f'chest_slow_queries_total{{endpoint="{endpoint}"}} {count}')
+        return '\n'.join(lines) + '\n'
@@ -1,20 +1,44 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import undefer_group
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
-db = SQLAlchemy()
+from replica import RoutingSession
+from video_embeds import resolve_embed
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class News(db.Model):
+    # Индексы под пагинацию по ключу (created_at, id)
+    __table_args__ = (
+        db.Index('ix_news_created_at_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Счетчики поддерживаются при вставке и удалении связанных записей (см. ниже)
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    image_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    video_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     comments = db.relationship('Comment', backref='news', lazy=True, cascade='all, delete-orphan')
     images = db.relationship('NewsImage', backref='news', lazy=True, cascade='all, delete-orphan')
     videos = db.relationship('NewsVideo', backref='news', lazy=True, cascade='all, delete-orphan')
 
+    @classmethod
+    def list_query(cls):
+        """Запрос для списков: обложка загружается вместе с новостью"""
+        return cls.query.options(undefer_group('list_media'))
+
 class NewsImage(db.Model):
+    # Обложка и галерея выбираются по новости в порядке отображения
+    __table_args__ = (
+        db.Index('ix_news_image_news_id_order', 'news_id', 'order', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     news_id = db.Column(db.Integer, db.ForeignKey('news.id'), nullable=False)
     image_path = db.Column(db.String(255), nullable=False)
@@ -22,6 +46,10 @@ class NewsImage(db.Model):
     order = db.Column(db.Integer, default=0)  # для порядка отображения
 
 class NewsVideo(db.Model):
+    __table_args__ = (
+        db.Index('ix_news_video_news_id_order', 'news_id', 'order', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     news_id = db.Column(db.Integer, db.ForeignKey('news.id'), nullable=False)
     video_url = db.Column(db.String(500))  # Для внешних ссылок
@@ -30,8 +58,40 @@ class NewsVideo(db.Model):
     title = db.Column(db.String(100))  # Название видео
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     order = db.Column(db.Integer, default=0)
+    # Параметры встраивания, вычисляются по video_url при сохранении
+    embed_provider = db.Column(db.String(20))
+    embed_id = db.Column(db.String(100))
+    embed_url = db.Column(db.String(500))
+
+    def resolve_embed(self):
+        embed = resolve_embed(self.video_type, self.video_url)
+        self.embed_provider, self.embed_id, self.embed_url = embed if embed else (None, None, None)
+
+
+def _resolve_video_embed(mapper, connection, target):
+    target.resolve_embed()
+
+
+for _event_name in ('before_insert', 'before_update'):
+    event.listen(NewsVideo, _event_name, _resolve_video_embed)
+
+
+# Обложка для карточек новостей (коррелированный подзапрос, по умолчанию отложен)
+News.cover_image_path = db.column_property(
+    select(NewsImage.image_path)
+    .where(NewsImage.news_id == News.id)
+    .order_by(NewsImage.order, NewsImage.id)
+    .limit(1)
+    .correlate_except(NewsImage)
+    .scalar_subquery(),
+    deferred=True, group='list_media'
+)
 
 class Comment(db.Model):
+    __table_args__ = (
+        db.Index('ix_comment_news_id_created_at_id', 'news_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     news_id = db.Column(db.Integer, db.ForeignKey('news.id'), nullable=False)
     author = db.Column(db.String(50), nullable=False)
@@ -42,7 +102,51 @@ class Comment(db.Model):
         return f'<Comment {self.author}>'
 
 
+# Счетчик новости, который меняется при вставке/удалении каждой модели
+NEWS_COUNTERS = {
+    Comment: 'comment_count',
+    NewsImage: 'image_count',
+    NewsVideo: 'video_count',
+}
+
+
+def _counter_listener(column_name, delta):
+    def listener(mapper, connection, target):
+        # UPDATE выполняется в той же транзакции, что и сама вставка/удаление
+        column = News.__table__.c[column_name]
+        connection.execute(
+            update(News.__table__)
+            .where(News.__table__.c.id == target.news_id)
+            .values({column: column + delta})
+        )
+    return listener
+
+
+for _model, _column_name in NEWS_COUNTERS.items():
+    event.listen(_model, 'after_insert', _counter_listener(_column_name, 1))
+    event.listen(_model, 'after_delete', _counter_listener(_column_name, -1))
+
+
+def reconcile_news_counters():
+    """Пересчитывает счетчики всех новостей по фактическим данным, возвращает число исправленных"""
+    news_table = News.__table__
+    values = {
+        column_name: select(func.count())
+        .where(model.__table__.c.news_id == news_table.c.id)
+        .scalar_subquery()
+        for model, column_name in NEWS_COUNTERS.items()
+    }
+    drifted = db.or_(*[news_table.c[column_name] != value for column_name, value in values.items()])
+    result = db.session.execute(update(news_table).where(drifted).values(values))
+    db.session.commit()
+    return result.rowcount
+
+
 class Event(db.Model):
+    __table_args__ = (
+        db.Index('ix_event_event_date_id', 'event_date', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -55,6 +159,25 @@ class Event(db.Model):
         return f'<Event {self.title}>'
 
 
+class OutboxMessage(db.Model):
+    """Письмо в очереди на отправку (заполняется формой обратной связи)"""
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(120))
+    recipients = db.Column(db.String(500), nullable=False)  # адреса через запятую
+    reply_to = db.Column(db.String(120))
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<OutboxMessage {self.id} {self.status}>'
+
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -62,8 +185,8 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(255))
     is_admin = db.Column(db.Boolean, default=False)
 
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+    def set_password(self, password, method='scrypt'):
+        self.password_hash = generate_password_hash(password, method=method)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
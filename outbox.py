@@ -0,0 +1,181 @@
+import os
+import smtplib
+import threading
+from datetime import datetime, timedelta
+
+from flask_mail import BadHeaderError, Message
+
+from models import db, OutboxMessage
+
+
+class Outbox:
+    """Очередь исходящих писем в базе и фоновый отправитель.
+
+    Запрос только сохраняет письмо; поток-отправитель забирает письма пакетами
+    и отправляет их через одно SMTP-соединение, повторяя неудачные попытки с
+    экспоненциальной задержкой.
+    """
+
+    def __init__(self, app=None, mail=None):
+        self.app = None
+        self.mail = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app, mail)
+
+    def init_app(self, app, mail):
+        app.config.setdefault('OUTBOX_SENDER_ENABLED', True)
+        app.config.setdefault('OUTBOX_BATCH_SIZE', 20)
+        app.config.setdefault('OUTBOX_MAX_ATTEMPTS', 6)
+        app.config.setdefault('OUTBOX_RETRY_DELAY', 30)
+        app.config.setdefault('OUTBOX_POLL_INTERVAL', 30)
+        self.app = app
+        self.mail = mail
+        app.extensions['outbox'] = self
+        if app.config['OUTBOX_SENDER_ENABLED']:
+            app.before_request(self.ensure_started)
+
+    def enqueue(self, subject, recipients, body, sender=None, reply_to=None):
+        """Сохраняет письмо в очередь и будит отправителя"""
+        message = OutboxMessage(
+            subject=subject,
+            sender=sender,
+            recipients=','.join(recipients),
+            reply_to=reply_to,
+            body=body
+        )
+        db.session.add(message)
+        db.session.commit()
+        self._wakeup.set()
+        return message
+
+    def ensure_started(self):
+        """Запускает поток-отправитель (в каждом процессе, в том числе после fork)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='outbox-sender', daemon=True)
+            self._thread.start()
+
+    def _claim_batch(self):
+        query = OutboxMessage.query.filter(
+            OutboxMessage.status == 'pending',
+            OutboxMessage.next_attempt_at <= datetime.utcnow()
+        ).order_by(OutboxMessage.id).limit(self.app.config['OUTBOX_BATCH_SIZE'])
+        # Несколько процессов не возьмут одно и то же письмо (PostgreSQL)
+        return query.with_for_update(skip_locked=True).all()
+
+    @staticmethod
+    def _build_message(message):
+        return Message(
+            subject=message.subject,
+            sender=message.sender,
+            recipients=message.recipients.split(','),
+            reply_to=message.reply_to,
+            body=message.body
+        )
+
+    def _record_failure(self, message, error):
+        message.attempts = (message.attempts or 0) + 1
+        message.last_error = str(error)
+        if message.attempts >= self.app.config['OUTBOX_MAX_ATTEMPTS']:
+            message.status = 'failed'
+        else:
+            delay = self.app.config['OUTBOX_RETRY_DELAY'] * 2 ** (message.attempts - 1)
+            message.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.__exit__(None, None, None)
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def _send_batch(self, connection, messages):
+        """Отправляет пакет; возвращает (число отправленных, соединение для следующего пакета)"""
+        sent = 0
+        for message in messages:
+            try:
+                if connection is None:
+                    connection = self.mail.connect().__enter__()
+                connection.send(self._build_message(message))
+            except (BadHeaderError, AssertionError, smtplib.SMTPRecipientsRefused) as e:
+                # Ошибка в самом письме - остальные письма пакета это не затрагивает
+                print(f"Ошибка отправки письма {message.id}: {str(e)}")
+                self._record_failure(message, e)
+                continue
+            except (smtplib.SMTPException, OSError) as e:
+                print(f"Ошибка отправки письма {message.id}: {str(e)}")
+                self._record_failure(message, e)
+                if connection is not None:
+                    self._close(connection)
+                    connection = None
+                # Сервер недоступен - остальные письма пакета попробуем позже
+                break
+
+            message.status = 'sent'
+            message.sent_at = datetime.utcnow()
+            message.last_error = None
+            sent += 1
+
+        db.session.commit()
+        return sent, connection
+
+    def process(self, connection=None):
+        """Обрабатывает один пакет; возвращает (число отправленных писем, соединение)"""
+        messages = self._claim_batch()
+        if not messages:
+            db.session.commit()
+            return 0, connection
+        if connection is not None and connection.host is not None:
+            # Проверяем, что сервер не закрыл соединение, пока очередь простаивала
+            try:
+                connection.host.noop()
+            except (smtplib.SMTPException, OSError):
+                self._close(connection)
+                connection = None
+        return self._send_batch(connection, messages)
+
+    def flush(self):
+        """Синхронно отправляет все готовые письма (для скриптов и проверки)"""
+        connection = None
+        total = 0
+        try:
+            while True:
+                sent, connection = self.process(connection)
+                if not sent:
+                    return total
+                total += sent
+        finally:
+            if connection is not None:
+                self._close(connection)
+
+    def _run(self):
+        connection = None
+        while True:
+            sent = 0
+            with self.app.app_context():
+                try:
+                    sent, connection = self.process(connection)
+                except Exception as e:
+                    print(f"Ошибка обработки очереди писем: {str(e)}")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+            if sent:
+                # Пока в очереди есть письма, продолжаем через то же соединение
+                continue
+
+            woken = self._wakeup.wait(self.app.config['OUTBOX_POLL_INTERVAL'])
+            self._wakeup.clear()
+            if not woken and connection is not None:
+                # Очередь простаивает - закрываем соединение, чтобы сервер не оборвал его сам
+                self._close(connection)
+                connection = None
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+
+
+class PageCache:
+    """Кэш готовых HTML-страниц для анонимных GET-запросов.
+
+    Записи помечаются тегами ('news', 'events'). Сброс тега меняет mtime файла-метки
+    в общей директории, поэтому инвалидация видна всем процессам приложения.
+    """
+
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PAGE_CACHE_ENABLED', True)
+        app.config.setdefault('PAGE_CACHE_DIR', '/data/cache/pages')
+        app.config.setdefault('PAGE_CACHE_TIMEOUT', 300)
+        app.config.setdefault('PAGE_CACHE_MAX_ENTRIES', 512)
+        os.makedirs(app.config['PAGE_CACHE_DIR'], exist_ok=True)
+        app.extensions['page_cache'] = self
+
+    def _tag_version(self, tag):
+        try:
+            return os.stat(os.path.join(current_app.config['PAGE_CACHE_DIR'], tag)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def tag_versions(self, *tags):
+        """Версии тегов (mtime файлов-меток в нс): меняются при каждом сбросе"""
+        return tuple(self._tag_version(tag) for tag in tags)
+
+    def invalidate(self, *tags):
+        """Сбрасывает все страницы с указанными тегами во всех процессах"""
+        for tag in tags:
+            path = os.path.join(current_app.config['PAGE_CACHE_DIR'], tag)
+            with open(path, 'a'):
+                pass
+            # Явно выставляем время, чтобы две записи подряд не совпали по mtime
+            now_ns = time.time_ns()
+            os.utime(path, ns=(now_ns, max(now_ns, self._tag_version(tag) + 1)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['versions'] != versions or entry['expires'] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > current_app.config['PAGE_CACHE_MAX_ENTRIES']:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _is_cacheable_request():
+        return (
+            current_app.config['PAGE_CACHE_ENABLED']
+            and request.method == 'GET'
+            and not current_user.is_authenticated
+            and '_flashes' not in session
+        )
+
+    def cached(self, *tags):
+        """Декоратор маршрута: кэширует ответ для анонимных посетителей"""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self._is_cacheable_request():
+                    return view(*args, **kwargs)
+
+                key = (request.endpoint, request.full_path)
+                versions = self.tag_versions(*tags)
+                entry = self._get(key, versions)
+
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        return response
+
+                    body = response.get_data()
+                    entry = {
+                        'body': body,
+                        'mimetype': response.mimetype,
+                        'etag': hashlib.sha256(body).hexdigest(),
+                        'versions': versions,
+                        'expires': time.monotonic() + current_app.config['PAGE_CACHE_TIMEOUT'],
+                    }
+                    self._set(key, entry)
+
+                response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+                response.set_etag(entry['etag'])
+                response.cache_control.no_cache = True
+                response.vary.add('Cookie')
+                return response.make_conditional(request)
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,82 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+def _encode_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _decode_value(column, value):
+    if column.type.python_type is datetime:
+        return datetime.fromisoformat(value)
+    return column.type.python_type(value)
+
+
+class KeysetPagination:
+    """Пагинация по ключу (курсору) вместо OFFSET.
+
+    Страница выбирается условием (col1, col2) < (значения последней записи), поэтому
+    при подходящем составном индексе глубокие страницы стоят столько же, сколько первая,
+    и не нужен COUNT(*). Курсор - непрозрачная строка для параметра ?cursor=.
+    """
+
+    def __init__(self, query, columns, per_page, cursor=None, descending=True):
+        self.columns = columns
+        self.per_page = per_page
+        self.descending = descending
+
+        direction, values = self._decode_cursor(cursor)
+        backwards = direction == 'prev'
+
+        # При движении назад читаем в обратном порядке, а потом разворачиваем страницу
+        forward_order = not descending if backwards else descending
+        rows = self.keyset_query(query, columns, values, forward_order).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+
+        if backwards:
+            rows.reverse()
+            self.has_prev, self.has_next = has_more, True
+        else:
+            self.has_prev, self.has_next = values is not None, has_more
+
+        self.items = rows
+
+    @staticmethod
+    def keyset_query(query, columns, values=None, descending=True):
+        """Добавляет к запросу условие "после ключа values" и сортировку по columns"""
+        key = tuple_(*columns)
+        if values is not None:
+            bound = tuple_(*values)
+            query = query.filter(key < bound if descending else key > bound)
+        return query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def _decode_cursor(self, cursor):
+        if not cursor:
+            return None, None
+        try:
+            direction, raw_values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values = [_decode_value(column, value) for column, value in zip(self.columns, raw_values, strict=True)]
+        except (ValueError, TypeError, binascii.Error):
+            # Испорченный курсор - показываем первую страницу
+            return None, None
+        return direction, values
+
+    def _encode_cursor(self, direction, item):
+        values = [_encode_value(getattr(item, column.key)) for column in self.columns]
+        return base64.urlsafe_b64encode(json.dumps([direction, values]).encode()).decode()
+
+    @property
+    def next_cursor(self):
+        return self._encode_cursor('next', self.items[-1]) if self.has_next and self.items else None
+
+    @property
+    def prev_cursor(self):
+        return self._encode_cursor('prev', self.items[0]) if self.has_prev and self.items else None
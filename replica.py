@@ -0,0 +1,100 @@
+import os
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """Сессия, которая отправляет чтение в реплику, если маршрут это разрешил.
+
+    Запись (flush, UPDATE/DELETE/INSERT) и все запросы после нее в той же сессии
+    всегда идут в основную базу.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False) \
+                and not self.info.get('wrote') and _replica_allowed() and REPLICA_BIND in self._db.engines:
+            return self._db.engines[REPLICA_BIND]
+
+        if self._flushing or getattr(clause, 'is_dml', False):
+            self.info['wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _replica_allowed():
+    return has_request_context() and g.get('_read_replica', False)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('wrote', False):
+        record_write()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('wrote', None)
+
+
+def _marker_path():
+    return current_app.config['DATABASE_REPLICA_MARKER']
+
+
+def replica_enabled():
+    return REPLICA_BIND in (current_app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+def record_write():
+    """Отмечает запись: ближайшие DATABASE_REPLICA_LAG секунд все читают из основной базы"""
+    if has_request_context():
+        g._read_replica = False
+    if not replica_enabled():
+        return
+    # mtime файла-метки виден всем процессам приложения
+    with open(_marker_path(), 'a'):
+        pass
+    os.utime(_marker_path())
+
+
+def _recent_write():
+    try:
+        last_write = os.stat(_marker_path()).st_mtime
+    except FileNotFoundError:
+        return False
+    return time.time() - last_write < current_app.config['DATABASE_REPLICA_LAG']
+
+
+class ReadReplica:
+    """Маршрутизация чтения в реплику для маршрутов, отмеченных декоратором reads.
+
+    Реплика отстает от основной базы, поэтому после любой записи чтение на время
+    DATABASE_REPLICA_LAG возвращается в основную базу - пользователь сразу видит
+    свой комментарий, а кэш страниц не сохраняет устаревшую копию.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DATABASE_REPLICA_LAG', 5)
+        app.config.setdefault('DATABASE_REPLICA_MARKER', '/data/cache/last_write')
+        os.makedirs(os.path.dirname(app.config['DATABASE_REPLICA_MARKER']), exist_ok=True)
+        app.extensions['read_replica'] = self
+
+    @staticmethod
+    def reads(view):
+        """Декоратор маршрута: GET-запросы читают из реплики"""
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method == 'GET' and replica_enabled() and not _recent_write():
+                g._read_replica = True
+            return view(*args, **kwargs)
+
+        return wrapper
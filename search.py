@@ -0,0 +1,223 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import Text, cast, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import TSQUERY
+
+from models import db, News, Event
+
+# Конфигурация полнотекстового поиска PostgreSQL (русский стемминг)
+SEARCH_CONFIG = 'russian'
+
+# Поля и их веса для tsvector: A - самый важный
+NEWS_SEARCH_FIELDS = [('title', 'A'), ('content', 'B')]
+EVENT_SEARCH_FIELDS = [('title', 'A'), ('description', 'B'), ('location', 'C')]
+
+# Веса для запасного индекса (совпадают по смыслу с A/B/C)
+FALLBACK_WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+
+SearchResults = namedtuple('SearchResults', ['news_pagination', 'events', 'total_events'])
+
+
+class SearchPagination(Pagination):
+    """Пагинация по уже найденной странице результатов (без повторных запросов)"""
+
+    def _query_items(self):
+        return self._query_args['items']
+
+    def _query_count(self):
+        return self._query_args['total']
+
+
+def _vector_expression(fields):
+    """SQL-выражение tsvector для сгенерированной колонки"""
+    parts = [
+        f"setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce({column}, '')), '{weight}')"
+        for column, weight in fields
+    ]
+    return ' || '.join(parts)
+
+
+def create_search_index():
+    """Создает колонки search_vector и GIN-индексы (только для PostgreSQL)"""
+    if db.engine.dialect.name != 'postgresql':
+        return False
+
+    for table, fields in (('news', NEWS_SEARCH_FIELDS), ('event', EVENT_SEARCH_FIELDS)):
+        # Сгенерированная колонка поддерживается самим PostgreSQL при любых INSERT/UPDATE
+        db.session.execute(text(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({_vector_expression(fields)}) STORED"
+        ))
+        db.session.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING GIN (search_vector)"
+        ))
+    db.session.commit()
+    return True
+
+
+# --- PostgreSQL ---
+
+def _ts_query(query):
+    # plainto_tsquery объединяет слова через AND, а поиск исторически искал любое из слов
+    return cast(func.replace(cast(func.plainto_tsquery(SEARCH_CONFIG, query), Text), '&', '|'), TSQUERY)
+
+
+def search_statement(model, query, order_column, limit, offset=0):
+    """Ранжированная выборка и общее количество за один проход по индексу"""
+    vector = literal_column(f'{model.__tablename__}.search_vector')
+    ts_query = _ts_query(query)
+
+    return (
+        select(model, func.count().over().label('total'))
+        .where(vector.op('@@')(ts_query))
+        .order_by(func.ts_rank(vector, ts_query).desc(), order_column.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+def count_statement(model, query):
+    """Число совпадений без выборки строк"""
+    vector = literal_column(f'{model.__tablename__}.search_vector')
+    return select(func.count()).select_from(model).where(vector.op('@@')(_ts_query(query)))
+
+
+def _search_table_postgres(model, query, order_column, limit, offset):
+    rows = db.session.execute(search_statement(model, query, order_column, limit, offset)).all()
+    items = [row[0] for row in rows]
+    if rows:
+        total = rows[0].total
+    elif offset:
+        # За последней страницей count() OVER() не по чему считать, а совпадения могут быть
+        total = db.session.execute(count_statement(model, query)).scalar()
+    else:
+        total = 0
+    return items, total
+
+
+def _search_postgres(query, page, per_page, events_limit):
+    news_items, total_news = _search_table_postgres(
+        News, query, News.created_at, per_page, (page - 1) * per_page
+    )
+    events, total_events = _search_table_postgres(Event, query, Event.event_date, events_limit, 0)
+    return news_items, total_news, events, total_events
+
+
+# --- Запасной вариант: инвертированный индекс в памяти процесса ---
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(value):
+    """Разбивает текст на нормализованные слова"""
+    return [token.replace('ё', 'е') for token in _TOKEN_RE.findall((value or '').lower())]
+
+
+class InvertedIndex:
+    """Инвертированный индекс по одной модели с поиском по префиксу слова.
+
+    Индекс помечен версией тега кэша страниц (tag), с которой он построен. Тег
+    сбрасывается при каждой записи в любом процессе, поэтому воркеры замечают
+    изменения, сделанные другими воркерами, и перестраивают индекс при поиске.
+    """
+
+    def __init__(self, model, fields, order_column, tag):
+        self.model = model
+        self.fields = fields
+        self.order_column = order_column
+        self.tag = tag
+        self.version = None
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._vocabulary = []
+        self._order_keys = {}
+
+    def rebuild(self, version=None):
+        columns = [getattr(self.model, name) for name, _ in self.fields]
+        rows = db.session.execute(select(self.model.id, self.order_column, *columns)).all()
+
+        postings = {}
+        order_keys = {}
+        for row in rows:
+            doc_id = row[0]
+            order_keys[doc_id] = row[1]
+            for (_, weight), value in zip(self.fields, row[2:]):
+                for token in tokenize(value):
+                    docs = postings.setdefault(token, {})
+                    docs[doc_id] = docs.get(doc_id, 0) + FALLBACK_WEIGHTS[weight]
+
+        self._postings = postings
+        self._vocabulary = sorted(postings)
+        self._order_keys = order_keys
+        self.version = version
+
+    def search(self, terms):
+        """Возвращает id документов, отсортированные по релевантности"""
+        # Версия читается до перестроения: запись, закоммиченная во время него,
+        # сменит тег еще раз, и следующий поиск перестроит индекс снова
+        version = current_app.extensions['page_cache'].tag_versions(self.tag)[0]
+        with self._lock:
+            if self.version is None or self.version != version:
+                self.rebuild(version)
+            postings, vocabulary, order_keys = self._postings, self._vocabulary, self._order_keys
+
+        scores = {}
+        for term in terms:
+            # Все слова словаря, начинающиеся с term (грубая замена стемминга)
+            position = bisect_left(vocabulary, term)
+            while position < len(vocabulary) and vocabulary[position].startswith(term):
+                for doc_id, weight in postings[vocabulary[position]].items():
+                    scores[doc_id] = scores.get(doc_id, 0) + weight
+                position += 1
+
+        return sorted(scores, key=lambda doc_id: (scores[doc_id], order_keys[doc_id]), reverse=True)
+
+
+_news_index = InvertedIndex(News, NEWS_SEARCH_FIELDS, News.created_at, 'news')
+_event_index = InvertedIndex(Event, EVENT_SEARCH_FIELDS, Event.event_date, 'events')
+
+
+def invalidate_fallback_index():
+    """Сбрасывает запасной индекс этого процесса после массовых операций.
+
+    Другие процессы увидят изменения по новой версии тегов 'news' и 'events'.
+    """
+    _news_index.version = None
+    _event_index.version = None
+
+
+def _load_in_order(model, ids):
+    if not ids:
+        return []
+    objects = {obj.id: obj for obj in model.query.filter(model.id.in_(ids)).all()}
+    return [objects[obj_id] for obj_id in ids if obj_id in objects]
+
+
+def _search_fallback(query, page, per_page, events_limit):
+    terms = tokenize(query)
+    news_ids = _news_index.search(terms)
+    event_ids = _event_index.search(terms)
+
+    offset = (page - 1) * per_page
+    news_items = _load_in_order(News, news_ids[offset:offset + per_page])
+    events = _load_in_order(Event, event_ids[:events_limit])
+    return news_items, len(news_ids), events, len(event_ids)
+
+
+def search(query, page=1, per_page=10, events_limit=10):
+    """Ищет новости (с пагинацией) и мероприятия, упорядоченные по релевантности"""
+    page = max(page, 1)
+    if db.engine.dialect.name == 'postgresql':
+        news_items, total_news, events, total_events = _search_postgres(query, page, per_page, events_limit)
+    else:
+        news_items, total_news, events, total_events = _search_fallback(query, page, per_page, events_limit)
+
+    news_pagination = SearchPagination(
+        page=page, per_page=per_page, error_out=False, items=news_items, total=total_news
+    )
+    return SearchResults(news_pagination, events, total_events)
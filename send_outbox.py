@@ -0,0 +1,9 @@
+from app import app, outbox
+
+def send_outbox():
+    with app.app_context():
+        sent = outbox.flush()
+        print(f"Отправлено писем из очереди: {sent}")
+
+if __name__ == '__main__':
+    send_outbox()
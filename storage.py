@@ -0,0 +1,104 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from werkzeug.utils import secure_filename
+
+# Имя файла в хранилище: sha256 содержимого + исходное расширение.
+# Варианты изображений (variants/<hash>.<ext>.<ширина>.<формат>) тоже считаются неизменяемыми.
+_CONTENT_ADDRESSED_RE = re.compile(r'(variants/)?[0-9a-f]{64}\.[a-z0-9]+(\.\d+\.[a-z]+)?')
+BUFFER_SIZE = 1024 * 1024
+
+
+def is_content_addressed(filename):
+    """Файл назван по хэшу содержимого, значит его байты по этому адресу никогда не изменятся"""
+    return _CONTENT_ADDRESSED_RE.fullmatch(filename) is not None
+
+
+def _extension(original_filename):
+    filename = secure_filename(original_filename or '')
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else 'bin'
+
+
+def _content_addressed_name(digest, original_filename):
+    return f'{digest}.{_extension(original_filename)}'
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _commit_file(temp_path, folder, filename):
+    target = os.path.join(folder, filename)
+    if os.path.exists(target):
+        # Такой файл уже есть - одинаковые загрузки хранятся один раз.
+        # Обновляем mtime, чтобы сборщик media_gc не удалил файл, пока новая запись о нем не сохранена
+        os.remove(temp_path)
+        os.utime(target)
+    else:
+        os.replace(temp_path, target)
+    return filename
+
+
+def save_stream(stream, folder, original_filename):
+    """Сохраняет поток под именем по хэшу содержимого и возвращает это имя"""
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for block in iter(lambda: stream.read(BUFFER_SIZE), b''):
+                digest.update(block)
+                f.write(block)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    return _commit_file(temp_path, folder, _content_addressed_name(digest.hexdigest(), original_filename))
+
+
+def save_upload(file_storage, folder):
+    """Сохраняет загруженный файл под именем по хэшу содержимого и возвращает это имя"""
+    return save_stream(file_storage.stream, folder, file_storage.filename)
+
+
+def store_file(path, folder, original_filename):
+    """Переносит уже лежащий на диске файл в хранилище (в пределах одной файловой системы)"""
+    filename = _content_addressed_name(file_digest(path), original_filename)
+    return _commit_file(path, folder, filename)
+
+
+def link_file(source_path, target_path):
+    """Делает target_path копией source_path (жесткой ссылкой, если получается); исходный файл остается"""
+    try:
+        os.link(source_path, target_path)
+        return
+    except FileExistsError:
+        # Содержимое то же - файл назван по хэшу; обновляем mtime для сборщика media_gc
+        os.utime(target_path)
+        return
+    except OSError:
+        pass  # файловая система без жестких ссылок - копируем
+
+    folder = os.path.dirname(target_path)
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix='.upload-')
+    os.close(fd)
+    try:
+        shutil.copyfile(source_path, temp_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    _commit_file(temp_path, folder, os.path.basename(target_path))
+
+
+def copy_file(path, folder, original_filename):
+    """Добавляет в хранилище копию файла, не трогая исходный; возвращает имя в хранилище"""
+    filename = _content_addressed_name(file_digest(path), original_filename)
+    link_file(path, os.path.join(folder, filename))
+    return filename
@@ -0,0 +1,71 @@
+import os
+
+from flask import current_app, request
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+
+class FragmentCacheExtension(Extension):
+    """Тег {% fragment 'имя' %}...{% endfragment %}: блок рендерится один раз на процесс.
+
+    Подходит только для частей шаблона, которые не зависят от запроса и
+    пользователя (навигация, подвал). При auto_reload шаблонов кэш не используется,
+    чтобы правки были видны сразу.
+    """
+
+    tags = {'fragment'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache={})
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        body = parser.parse_statements(('name:endfragment',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [name]), [], [], body).set_lineno(lineno)
+
+    def _render(self, name, caller):
+        if not current_app.config['TEMPLATE_FRAGMENT_CACHE_ENABLED'] or self.environment.auto_reload:
+            return caller()
+        # url_for внутри фрагмента зависит от префикса, под которым смонтировано приложение
+        key = (name, request.script_root)
+        fragment = self.environment.fragment_cache.get(key)
+        if fragment is None:
+            fragment = self.environment.fragment_cache[key] = caller()
+        return fragment
+
+
+class TemplateCache:
+    """Байткод шаблонов Jinja на постоянном диске и кэш статичных фрагментов.
+
+    Скомпилированные шаблоны сохраняются в TEMPLATE_CACHE_DIR, поэтому новый
+    воркер после деплоя или масштабирования загружает готовый байткод вместо
+    разбора исходников. precompile() компилирует все шаблоны заранее.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TEMPLATE_CACHE_DIR', '/data/cache/templates')
+        app.config.setdefault('TEMPLATE_FRAGMENT_CACHE_ENABLED', True)
+        os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.extensions['template_cache'] = self
+
+    @staticmethod
+    def precompile(app):
+        """Компилирует все шаблоны приложения: байткод попадает на диск и в память процесса"""
+        names = app.jinja_env.list_templates(extensions=['html'])
+        for name in names:
+            app.jinja_env.get_template(name)
+        return names
+
+    @staticmethod
+    def clear(app):
+        """Удаляет сохраненный байткод и фрагменты (например, после смены версии Jinja)"""
+        app.jinja_env.bytecode_cache.clear()
+        app.jinja_env.fragment_cache.clear()
@@ -0,0 +1,93 @@
+"""Списки новостей не должны делать запросы на каждую карточку (N+1).
+
+Число SQL-запросов для страницы списка не зависит от per_page.
+"""
+import os
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix='chest-tests-')
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{os.path.join(_tmp, "test.db")}')
+os.environ.setdefault('PAGE_CACHE_ENABLED', '0')
+for _name in ('PAGE_CACHE_DIR', 'TEMPLATE_CACHE_DIR', 'ASSETS_DIR'):
+    os.environ.setdefault(_name, os.path.join(_tmp, _name.lower()))
+for _name in ('DATABASE_REPLICA_MARKER', 'USER_CACHE_MARKER'):
+    os.environ.setdefault(_name, os.path.join(_tmp, _name.lower()))
+
+from flask import render_template  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, News, NewsImage, NewsVideo, Comment  # noqa: E402
+from pagination import KeysetPagination  # noqa: E402
+
+NEWS_COUNT = 20
+
+
+@pytest.fixture(scope='module')
+def seeded_app():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for i in range(NEWS_COUNT):
+            news = News(title=f'Новость {i}', content='Текст ' * 50)
+            db.session.add(news)
+            db.session.flush()
+            for order in range(3):
+                db.session.add(NewsImage(news_id=news.id, image_path=f'uploads/{i}_{order}.jpg', order=order))
+            db.session.add(NewsVideo(news_id=news.id, video_url='https://youtube.com/watch?v=x', video_type='youtube'))
+            db.session.add(Comment(news_id=news.id, author='Автор', content='Комментарий'))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+def _count_list_queries(per_page):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.test_request_context('/news'):
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            pagination = KeysetPagination(News.list_query(), [News.created_at, News.id], per_page=per_page)
+            html = render_template('news.html', news_list=pagination.items, pagination=pagination)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        db.session.remove()
+
+    assert len(pagination.items) == per_page
+    assert html
+    return len(statements)
+
+
+def test_news_list_query_count_is_flat(seeded_app):
+    counts = {per_page: _count_list_queries(per_page) for per_page in (2, 6, 15)}
+    assert len(set(counts.values())) == 1, counts
+
+
+def test_news_page_query_count_is_flat(seeded_app):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    client = seeded_app.test_client()
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        first = client.get('/news')
+        first_count = len(statements)
+        statements.clear()
+        second = client.get('/')
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert first.status_code == 200 and second.status_code == 200
+    # Карточка не добавляет запросов: страницы из 6 новостей укладываются в пару SELECT
+    assert first_count <= 3
+    assert len(statements) <= 3
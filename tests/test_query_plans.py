@@ -0,0 +1,20 @@
+"""Горячие запросы используют индексы на большом наборе данных (check_query_plans.py).
+
+Нужна отдельная база PostgreSQL в QUERY_PLAN_DATABASE_URL - она будет очищена.
+Без нее тест пропускается. Проверка идет в отдельном процессе: приложение
+читает DATABASE_URL при импорте, а остальные тесты работают со своей базой.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.skipif(not os.environ.get('QUERY_PLAN_DATABASE_URL'), reason='QUERY_PLAN_DATABASE_URL не задан')
+def test_hot_queries_use_indexes():
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'check_query_plans.py')], cwd=ROOT,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
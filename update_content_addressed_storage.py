@@ -0,0 +1,110 @@
+import os
+import re
+from collections import Counter
+
+from app import app, db
+from images import VARIANTS_DIR
+from models import NewsImage, NewsVideo, Event
+import storage
+
+# Сколько записей сохранять в базе за один коммит
+BATCH_SIZE = 100
+# Суффикс варианта после имени исходного файла: .<ширина>.<формат>
+_VARIANT_SUFFIX_RE = re.compile(r'\.\d+\.[a-z]+')
+
+
+def _variants(folder, filename):
+    variants_folder = os.path.join(folder, VARIANTS_DIR)
+    if not os.path.isdir(variants_folder):
+        return []
+    return [variant for variant in os.listdir(variants_folder)
+            if variant.startswith(filename) and _VARIANT_SUFFIX_RE.fullmatch(variant[len(filename):])]
+
+
+def _copy_file(folder, filename, renamed):
+    """Копирует файл и его варианты под имя по хэшу содержимого, возвращает новое имя или None, если файла нет.
+
+    Старые файлы остаются на месте: их удаляет _remove_file после того, как
+    записи с новыми путями сохранены в базе.
+    """
+    if filename in renamed:
+        return renamed[filename]
+    if storage.is_content_addressed(filename):
+        return filename
+
+    path = os.path.join(folder, filename)
+    if not os.path.exists(path):
+        print(f"Файл не найден: {path}")
+        renamed[filename] = None
+        return None
+
+    new_filename = storage.copy_file(path, folder, filename)
+
+    # Копируем уже созданные варианты изображения под новое имя
+    variants_folder = os.path.join(folder, VARIANTS_DIR)
+    for variant in _variants(folder, filename):
+        storage.link_file(os.path.join(variants_folder, variant),
+                          os.path.join(variants_folder, new_filename + variant[len(filename):]))
+
+    renamed[filename] = new_filename
+    return new_filename
+
+
+def _remove_file(folder, filename):
+    paths = [os.path.join(folder, filename)]
+    paths += [os.path.join(folder, VARIANTS_DIR, variant) for variant in _variants(folder, filename)]
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def update_database():
+    """Переводит загруженные файлы на имена по хэшу содержимого.
+
+    Файлы сначала копируются, затем пачка записей сохраняется в базе, и только
+    после этого удаляются старые файлы, на которые больше не ссылается ни одна
+    еще не обновленная запись. Если скрипт прервется, записи указывают на
+    существующие файлы, и повторный запуск продолжит с места остановки; копии,
+    оставшиеся без записей, удалит сборщик collect_media.py.
+    """
+    with app.app_context():
+        upload_folder = app.config['UPLOAD_FOLDER']
+        video_folder = os.path.join(upload_folder, 'videos')
+        renamed_images = {}
+        renamed_videos = {}
+
+        records = [(image, 'image_path', image.image_path, upload_folder, 'uploads', renamed_images)
+                   for image in NewsImage.query.all()]
+        records += [(event, 'image_path', event.image_path, upload_folder, 'uploads', renamed_images)
+                    for event in Event.query.filter(Event.image_path.isnot(None)).all()]
+        records += [(video, 'video_path', video.video_path, video_folder, 'uploads/videos', renamed_videos)
+                    for video in NewsVideo.query.filter(NewsVideo.video_path.isnot(None)).all()]
+
+        # Один файл может быть у нескольких записей: удаляем его, когда обновлены все
+        references = Counter((folder, path.split('/')[-1]) for _, _, path, folder, _, _ in records)
+
+        updated = 0
+        for start in range(0, len(records), BATCH_SIZE):
+            replaced = []
+            for record, attribute, path, folder, prefix, renamed in records[start:start + BATCH_SIZE]:
+                filename = path.split('/')[-1]
+                new_filename = _copy_file(folder, filename, renamed)
+                if new_filename and new_filename != filename:
+                    setattr(record, attribute, f'{prefix}/{new_filename}')
+                    replaced.append((folder, filename))
+                    updated += 1
+
+            db.session.commit()
+
+            for key in replaced:
+                references[key] -= 1
+                if references[key] == 0:
+                    _remove_file(*key)
+
+        print(f"Пути к файлам обновлены: {updated} записей")
+
+
+if __name__ == '__main__':
+    update_database()
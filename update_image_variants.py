@@ -0,0 +1,22 @@
+from app import app
+from images import generate_variants
+from models import NewsImage, Event
+
+def update_image_variants():
+    with app.app_context():
+        image_paths = [path for (path,) in NewsImage.query.with_entities(NewsImage.image_path)]
+        image_paths += [path for (path,) in Event.query.with_entities(Event.image_path) if path]
+
+        processed = 0
+        for image_path in image_paths:
+            filename = image_path.split('/')[-1]
+            try:
+                generate_variants(app.config['UPLOAD_FOLDER'], filename)
+                processed += 1
+            except Exception as e:
+                print(f"Пропущено {filename}: {str(e)}")
+
+        print(f"Варианты изображений созданы: {processed} из {len(image_paths)}")
+
+if __name__ == '__main__':
+    update_image_variants()
@@ -0,0 +1,24 @@
+from sqlalchemy import inspect, text
+
+from app import app, db
+from models import reconcile_news_counters
+
+COUNTER_COLUMNS = ['comment_count', 'image_count', 'video_count']
+
+def update_database():
+    with app.app_context():
+        db.create_all()
+
+        # Добавляем колонки счетчиков в существующую таблицу новостей
+        existing = {column['name'] for column in inspect(db.engine).get_columns('news')}
+        for column in COUNTER_COLUMNS:
+            if column not in existing:
+                db.session.execute(text(f'ALTER TABLE news ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0'))
+        db.session.commit()
+
+        # Пересчитываем счетчики (можно запускать повторно для исправления расхождений)
+        fixed = reconcile_news_counters()
+        print(f"Счетчики новостей пересчитаны, исправлено записей: {fixed}")
+
+if __name__ == '__main__':
+    update_database()
@@ -0,0 +1,16 @@
+from app import app, db
+from models import News, NewsImage, NewsVideo, Comment, Event
+
+def update_database():
+    with app.app_context():
+        db.create_all()
+
+        # Составные индексы для пагинации по ключу и выборки медиа в уже существующих таблицах
+        for model in (News, NewsImage, NewsVideo, Comment, Event):
+            for index in model.__table__.indexes:
+                index.create(db.engine, checkfirst=True)
+
+        print("Индексы для пагинации и медиа созданы!")
+
+if __name__ == '__main__':
+    update_database()
@@ -0,0 +1,13 @@
+from app import app, db
+from search import create_search_index
+
+def update_database():
+    with app.app_context():
+        db.create_all()
+        if create_search_index():
+            print("Полнотекстовый индекс для новостей и мероприятий создан!")
+        else:
+            print("База данных не PostgreSQL - используется индекс в памяти процесса")
+
+if __name__ == '__main__':
+    update_database()
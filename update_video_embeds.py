@@ -0,0 +1,37 @@
+from sqlalchemy import inspect, text
+
+from app import app, db
+from models import NewsVideo
+
+EMBED_COLUMNS = [('embed_provider', 'VARCHAR(20)'), ('embed_id', 'VARCHAR(100)'), ('embed_url', 'VARCHAR(500)')]
+BATCH_SIZE = 500
+
+def update_database():
+    with app.app_context():
+        db.create_all()
+
+        # Добавляем колонки встраивания в существующую таблицу видео
+        existing = {column['name'] for column in inspect(db.engine).get_columns('news_video')}
+        for column, column_type in EMBED_COLUMNS:
+            if column not in existing:
+                db.session.execute(text(f'ALTER TABLE news_video ADD COLUMN {column} {column_type}'))
+        db.session.commit()
+
+        # Заполняем параметры встраивания пакетами по id (можно запускать повторно)
+        updated = 0
+        last_id = 0
+        while True:
+            videos = NewsVideo.query.filter(NewsVideo.id > last_id, NewsVideo.video_url.isnot(None)) \
+                .order_by(NewsVideo.id).limit(BATCH_SIZE).all()
+            if not videos:
+                break
+            for video in videos:
+                video.resolve_embed()
+            updated += sum(1 for video in videos if video.embed_url)
+            last_id = videos[-1].id
+            db.session.commit()
+
+        print(f"Параметры встраивания видео обновлены: {updated}")
+
+if __name__ == '__main__':
+    update_database()
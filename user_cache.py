@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event
+
+from models import db, User
+
+
+class CachedUser(UserMixin):
+    """Снимок пользователя для current_user: не привязан к сессии базы и безопасен между потоками"""
+
+    def __init__(self, id, username, is_admin):
+        self.id = id
+        self.username = username
+        self.is_admin = is_admin
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+class UserCache:
+    """Ограниченный кэш пользователей с временем жизни для Flask-Login.
+
+    Изменение пользователя после commit меняет mtime файла-метки, поэтому
+    устаревшие записи сбрасываются во всех процессах приложения.
+    """
+
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_ENABLED', True)
+        app.config.setdefault('USER_CACHE_TIMEOUT', 60)
+        app.config.setdefault('USER_CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('USER_CACHE_MARKER', '/data/cache/users')
+        os.makedirs(os.path.dirname(app.config['USER_CACHE_MARKER']), exist_ok=True)
+        app.extensions['user_cache'] = self
+        if not event.contains(db.session, 'after_flush', _collect_changed_users):
+            event.listen(db.session, 'after_flush', _collect_changed_users)
+            event.listen(db.session, 'after_commit', _invalidate_changed_users)
+            event.listen(db.session, 'after_rollback', _forget_changed_users)
+
+    @staticmethod
+    def _version():
+        try:
+            return os.stat(current_app.config['USER_CACHE_MARKER']).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def load(self, user_id):
+        """Возвращает CachedUser по id или None, если пользователя нет"""
+        if not current_app.config['USER_CACHE_ENABLED']:
+            user = db.session.get(User, user_id)
+            return CachedUser(user.id, user.username, bool(user.is_admin)) if user else None
+
+        version = self._version()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry['version'] == version and entry['expires'] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                return entry['user']
+
+        row = db.session.query(User.id, User.username, User.is_admin).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        user = CachedUser(row.id, row.username, bool(row.is_admin))
+
+        with self._lock:
+            self._entries[user_id] = {
+                'user': user,
+                'version': version,
+                'expires': time.monotonic() + current_app.config['USER_CACHE_TIMEOUT'],
+            }
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > current_app.config['USER_CACHE_MAX_ENTRIES']:
+                self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, *user_ids):
+        """Сбрасывает пользователей в этом процессе и все кэши других процессов"""
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+        path = current_app.config['USER_CACHE_MARKER']
+        with open(path, 'a'):
+            pass
+        # Явно выставляем время, чтобы две записи подряд не совпали по mtime
+        now_ns = time.time_ns()
+        os.utime(path, ns=(now_ns, max(now_ns, self._version() + 1)))
+
+
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault('changed_users', set())
+    changed.update(obj.id for obj in chain(session.new, session.dirty, session.deleted) if isinstance(obj, User))
+
+
+def _invalidate_changed_users(session):
+    # Сбрасываем только после commit, иначе другой процесс может закэшировать старые данные
+    changed = session.info.pop('changed_users', None)
+    if changed:
+        current_app.extensions['user_cache'].invalidate(*changed)
+
+
+def _forget_changed_users(session):
+    session.info.pop('changed_users', None)
@@ -0,0 +1,58 @@
+import re
+from collections import namedtuple
+
+Embed = namedtuple('Embed', ['provider', 'embed_id', 'embed_url'])
+
+VK_DOMAINS = ('vk.com', 'vkvideo.ru', 'm.vk.com')
+
+# Форматы ссылок VK в порядке приоритета
+VK_PATTERNS = [
+    re.compile(r'video-?(\d+)_(\d+)'),  # video-12345_67890 или video12345_67890
+    re.compile(r'video/(\d+)_(\d+)'),  # video/12345_67890
+    re.compile(r'video\.php\?.*?oid=([^&]+).*?id=([^&]+)'),  # video.php?oid=...&id=...
+]
+
+RUTUBE_PATTERNS = [
+    re.compile(r'video/([a-zA-Z0-9]+)/'),  # .../video/abc123/
+    re.compile(r'play/embed/([a-zA-Z0-9]+)'),  # .../play/embed/abc123
+    re.compile(r'video/([a-zA-Z0-9]+)\??'),  # .../video/abc123?
+]
+
+
+def _resolve_vk(url):
+    if not any(domain in url for domain in VK_DOMAINS):
+        return None
+    for pattern in VK_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            oid, video_id = match.groups()
+            # Видео групп имеют отрицательный oid
+            if not oid.startswith('-'):
+                oid = f'-{oid}'
+            return Embed('vk', f'{oid}_{video_id}', f'https://vk.com/video_ext.php?oid={oid}&id={video_id}')
+    return None
+
+
+def _resolve_rutube(url):
+    if 'rutube.ru' not in url:
+        return None
+    for pattern in RUTUBE_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            video_id = match.group(1)
+            return Embed('rutube', video_id, f'https://rutube.ru/play/embed/{video_id}')
+    return None
+
+
+RESOLVERS = {
+    'vk': _resolve_vk,
+    'rutube': _resolve_rutube,
+}
+
+
+def resolve_embed(video_type, url):
+    """Возвращает параметры встраивания (Embed) для ссылки на видео или None"""
+    resolver = RESOLVERS.get(video_type)
+    if resolver is None or not url:
+        return None
+    return resolver(url)